@@ -0,0 +1,70 @@
+"""
+Measure per-send latency saved by reusing cached WhatsApp services
+
+Compares building a new WhatsAppService (Twilio client and HTTP session)
+for every send with the cached, connection-pooled service from
+create_whatsapp_service. The fake endpoint is plain HTTP, so the TLS
+handshake a real Twilio call would also save is not included.
+
+    python benchmarks/bench_client_reuse.py [--sends 300] [--latency 0.005]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('TWILIO_SEND_RATE', '100000')
+os.environ.setdefault('TWILIO_SEND_BURST', '100000')
+
+from twilio.http.http_client import TwilioHttpClient
+
+from fake_twilio import FakeTwilioServer
+from whatsapp_service import WhatsAppService, configure_connection_pool
+
+ACCOUNT_SID = 'AC' + '0' * 32
+
+def time_sends(get_service, sends):
+    timings = []
+    for i in range(sends):
+        start = time.perf_counter()
+        success, message = get_service().send_birthday_message('Bench', f"+9198{i:08d}", 'Bench')
+        timings.append(time.perf_counter() - start)
+        assert success, message
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sends', type=int, default=300)
+    parser.add_argument('--latency', type=float, default=0.005, help='fake Twilio latency in seconds')
+    args = parser.parse_args()
+
+    server = FakeTwilioServer(latency=args.latency).start()
+    try:
+        def fresh_service():
+            return WhatsAppService(ACCOUNT_SID, 'token', '+14155238886',
+                                   http_client=TwilioHttpClient(), api_base_url=server.base_url)
+
+        cached = WhatsAppService(ACCOUNT_SID, 'token', '+14155238886',
+                                 http_client=configure_connection_pool(TwilioHttpClient()),
+                                 api_base_url=server.base_url)
+
+        fresh_timings = time_sends(fresh_service, args.sends)
+        cached_timings = time_sends(lambda: cached, args.sends)
+
+        print(f"{args.sends} sequential sends, {args.latency * 1000:.1f} ms fake latency")
+        print(f"{'mode':>8} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8}")
+        for name, timings in (('fresh', fresh_timings), ('cached', cached_timings)):
+            timings = sorted(timings)
+            print(f"{name:>8} {statistics.mean(timings) * 1000:>8.2f} "
+                  f"{timings[len(timings) // 2] * 1000:>8.2f} {timings[int(len(timings) * 0.99)] * 1000:>8.2f}")
+        saved = statistics.mean(fresh_timings) - statistics.mean(cached_timings)
+        print(f"saved per send: {saved * 1000:.2f} ms")
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Measure dispatch throughput against a local fake Twilio endpoint
+
+    python benchmarks/bench_dispatch.py [--messages 500] [--latency 0.05] [--workers 1 4 8 16]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Measure dispatch itself, not the per-sender rate limit
+os.environ.setdefault('TWILIO_SEND_RATE', '100000')
+os.environ.setdefault('TWILIO_SEND_BURST', '100000')
+
+from fake_twilio import FakeTwilioServer
+from dispatch import dispatch_birthday_messages, MAX_IN_FLIGHT
+from whatsapp_service import WhatsAppService
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Twilio latency in seconds')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = FakeTwilioServer(latency=args.latency).start()
+    try:
+        service = WhatsAppService('AC' + '0' * 32, 'token', '+14155238886', api_base_url=server.base_url)
+        recipients = [(f"Contact {i}", f"+9198{i:08d}", None) for i in range(args.messages)]
+
+        print(f"{args.messages} messages, {args.latency * 1000:.0f} ms latency, in-flight cap {MAX_IN_FLIGHT}")
+        print(f"{'workers':>8} {'seconds':>8} {'msg/s':>8} {'sent':>6} {'peak in flight':>15}")
+        for workers in args.workers:
+            server.peak_in_flight = 0
+            start = time.perf_counter()
+            results = dispatch_birthday_messages(service, recipients, 'Bench', max_workers=workers)
+            elapsed = time.perf_counter() - start
+            sent = sum(1 for result in results if result['success'])
+            print(f"{workers:>8} {elapsed:>8.2f} {args.messages / elapsed:>8.1f} {sent:>6} {server.peak_in_flight:>15}")
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+"""
+End-to-end dispatch load test against the fake Twilio server
+
+Seeds N contacts whose birthday is today into a scratch SQLite database,
+starts benchmarks/fake_twilio.py in its own process and points the app at
+it through TWILIO_API_BASE_URL. Then it drives each mode over the same
+contacts, clearing the delivery ledger between modes:
+
+    scheduler  BirthdayScheduler.check_and_send_birthday_messages in-process
+    sharded    the same check with --processes dispatch worker processes
+    route      POST /api/whatsapp/send-birthday-messages, polling the job
+
+It reports messages/sec, p50/p99 per-send latency (in-process modes only)
+and peak RSS for each mode.
+
+    python benchmarks/bench_e2e.py [--contacts 1000] [--modes scheduler route] [--workers 8]
+        [--latency 0.05] [--error-rate 0.01] [--rate-cap 200] [--burst-every 10 --burst-length 1]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fake_twilio import add_server_arguments
+
+MODES = ('scheduler', 'sharded', 'route')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def fetch_json(url, method='GET'):
+    with urllib.request.urlopen(urllib.request.Request(url, method=method), timeout=5) as response:
+        return json.loads(response.read())
+
+def start_fake_twilio(args):
+    port = free_port()
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, 'fake_twilio.py'), '--port', str(port),
+        '--latency', str(args.latency), '--jitter', str(args.jitter), '--error-rate', str(args.error_rate),
+        '--rate-cap', str(args.rate_cap), '--burst-every', str(args.burst_every),
+        '--burst-length', str(args.burst_length)
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(500):
+        try:
+            fetch_json(base_url + '/__stats')
+            return process, base_url
+        except OSError:
+            time.sleep(0.01)
+    process.terminate()
+    raise RuntimeError('fake Twilio server did not start')
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux; children covers sharded worker processes
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(own / 1024, 1), round(children / 1024, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=1000)
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=['scheduler', 'route'])
+    parser.add_argument('--workers', type=int, default=8, help='dispatch threads per run')
+    parser.add_argument('--processes', type=int, default=4, help='worker processes for the sharded mode')
+    parser.add_argument('--send-rate', type=float, default=100000, help='TWILIO_SEND_RATE per sender')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--verbose', action='store_true', help='keep per-send INFO logging')
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='bench_e2e_')
+    fake_process, base_url = start_fake_twilio(args)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+    os.environ['TWILIO_API_BASE_URL'] = base_url
+    os.environ['TWILIO_SEND_RATE'] = str(args.send_rate)
+    os.environ['TWILIO_SEND_BURST'] = str(max(1, int(args.send_rate)))
+    # Keep the background retry drain out of the measurement
+    os.environ.setdefault('RETRY_POLL_SECONDS', '3600')
+
+    from app import app, db, Contact, Settings, MessageDelivery, bump_data_version
+    from database import ensure_database_exists
+    from rate_limiter import reset_rate_limiters
+    from scheduler_service import get_scheduler
+    from utils import get_birthday_key, get_local_today
+    from whatsapp_service import WhatsAppService
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    # Per-send latency, measured around each Twilio send made in this process
+    latencies = []
+    deliver = WhatsAppService.deliver_birthday_message
+
+    def timed_deliver(self, *send_args, **send_kwargs):
+        start = time.perf_counter()
+        try:
+            return deliver(self, *send_args, **send_kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    WhatsAppService.deliver_birthday_message = timed_deliver
+
+    today = get_local_today()
+    with app.app_context():
+        ensure_database_exists()
+        settings = Settings.query.first()
+        settings.wisher_name = 'Bench'
+        settings.twilio_account_sid = 'AC' + '0' * 32
+        settings.twilio_auth_token = 'token'
+        settings.twilio_whatsapp_number = '+14155238886'
+        birthdate = today.replace(year=1990) if not (today.month == 2 and today.day == 29) else today.replace(year=1992)
+        db.session.execute(Contact.__table__.insert(), [
+            {'name': f"Bench {i}", 'birthdate': birthdate, 'birthday_key': get_birthday_key(birthdate),
+             'whatsapp_number': f"+9198{i:08d}", 'whatsapp_e164': f"+9198{i:08d}"}
+            for i in range(args.contacts)
+        ])
+        bump_data_version('settings')
+        bump_data_version('contacts')
+        db.session.commit()
+
+    scheduler = get_scheduler()
+    scheduler.dispatch_workers = args.workers
+    client = app.test_client()
+    rows = []
+
+    try:
+        for mode in args.modes:
+            with app.app_context():
+                MessageDelivery.query.delete()
+                db.session.commit()
+            latencies.clear()
+            reset_rate_limiters()
+            fetch_json(base_url + '/__reset', method='POST')
+
+            start = time.perf_counter()
+            if mode == 'route':
+                response = client.post('/api/whatsapp/send-birthday-messages', json={'max_workers': args.workers})
+                job_id = response.get_json()['job_id']
+                while client.get(f'/api/whatsapp/jobs/{job_id}').get_json()['status'] in ('queued', 'running'):
+                    time.sleep(0.02)
+            else:
+                scheduler.dispatch_processes = args.processes if mode == 'sharded' else 1
+                scheduler.check_and_send_birthday_messages()
+            elapsed = time.perf_counter() - start
+
+            with app.app_context():
+                counts = dict(db.session.query(MessageDelivery.status, db.func.count()).group_by(MessageDelivery.status).all())
+            server_after = fetch_json(base_url + '/__stats')
+            attempted = sum(counts.values())
+            timings = sorted(latencies)
+            rss, children_rss = peak_rss_mb()
+            rows.append({
+                'mode': mode,
+                'contacts': args.contacts,
+                'seconds': round(elapsed, 3),
+                'messages_per_second': round(attempted / elapsed, 1) if elapsed else None,
+                'p50_ms': round(percentile(timings, 0.5) * 1000, 2) if timings else None,
+                'p99_ms': round(percentile(timings, 0.99) * 1000, 2) if timings else None,
+                'sent': counts.get('sent', 0),
+                'failed': attempted - counts.get('sent', 0),
+                'twilio_requests': server_after['requests'],
+                'peak_in_flight': server_after['peak_in_flight'],
+                'peak_rss_mb': rss,
+                'peak_child_rss_mb': children_rss
+            })
+    finally:
+        scheduler.shutdown()
+        fake_process.terminate()
+        fake_process.wait()
+
+    print(f"{args.contacts} contacts, {args.workers} workers, fake latency {args.latency * 1000:.0f} ms, "
+          f"error rate {args.error_rate}, rate cap {args.rate_cap or 'none'}")
+    print(f"{'mode':>10} {'seconds':>8} {'msg/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'sent':>6} {'failed':>6} "
+          f"{'requests':>8} {'RSS MB':>7}")
+    for row in rows:
+        p50 = f"{row['p50_ms']:.1f}" if row['p50_ms'] is not None else '-'
+        p99 = f"{row['p99_ms']:.1f}" if row['p99_ms'] is not None else '-'
+        rss = row['peak_rss_mb'] if row['mode'] != 'sharded' else max(row['peak_rss_mb'], row['peak_child_rss_mb'])
+        print(f"{row['mode']:>10} {row['seconds']:>8.2f} {row['messages_per_second']:>8.1f} {p50:>8} {p99:>8} "
+              f"{row['sent']:>6} {row['failed']:>6} {row['twilio_requests']:>8} {rss:>7}")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+if __name__ == '__main__':
+    main()
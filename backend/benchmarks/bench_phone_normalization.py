@@ -0,0 +1,101 @@
+"""
+Measure the per-send number normalization that write-time E.164 storage removes
+
+Before, every send normalized the contact's number and the sender's
+whatsapp: address again. Now both are normalized once (when the contact
+is written, and when the service is created) and a send only reads
+Contact.whatsapp_e164 and WhatsAppService.from_address. This times both
+per-send paths on a mix of number formats, plus the one-off write-time
+normalization for reference.
+
+    python benchmarks/bench_phone_normalization.py [--numbers 10000] [--repeat 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from phone_numbers import normalize_e164, to_whatsapp_address
+
+SENDER = '+1 415 523 8886'
+
+def legacy_format_phone_number(phone_number):
+    """The per-send normalization WhatsAppService.format_phone_number used to do"""
+    if phone_number.startswith("whatsapp:"):
+        phone_number = phone_number.replace("whatsapp:", "")
+    cleaned_number = ''.join(filter(str.isdigit, phone_number.replace('+', '')))
+    return '+' + cleaned_number
+
+def legacy_from_address(whatsapp_number):
+    """The sender address WhatsAppService used to build on every send"""
+    from_number = whatsapp_number or ""
+    if not from_number.startswith("whatsapp:"):
+        normalized_from = legacy_format_phone_number(from_number) if from_number else from_number
+        from_number = f"whatsapp:{normalized_from}" if normalized_from else from_number
+    return from_number
+
+class StoredContact:
+    __slots__ = ('whatsapp_number', 'whatsapp_e164')
+
+    def __init__(self, whatsapp_number):
+        self.whatsapp_number = whatsapp_number
+        self.whatsapp_e164 = normalize_e164(whatsapp_number)
+
+def sample_numbers(count, seed=42):
+    rng = random.Random(seed)
+    formats = [
+        lambda d: f"+91{d}",
+        lambda d: f"+91 {d[:5]} {d[5:]}",
+        lambda d: f"91-{d[:3]}-{d[3:6]}-{d[6:]}",
+        lambda d: f"whatsapp:+91{d}",
+        lambda d: f"(+91) {d[:4]} {d[4:7]} {d[7:]}",
+    ]
+    return [rng.choice(formats)(str(rng.randrange(6000000000, 9999999999))) for _ in range(count)]
+
+def best_per_item(statement, count, repeat):
+    return min(timeit.repeat(statement, number=1, repeat=repeat)) / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--numbers', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    numbers = sample_numbers(args.numbers)
+    contacts = [StoredContact(number) for number in numbers]
+    from_address = to_whatsapp_address(SENDER)
+
+    for contact in contacts:
+        assert contact.whatsapp_e164 == legacy_format_phone_number(contact.whatsapp_number)
+    assert from_address == legacy_from_address(SENDER)
+
+    def legacy_send_path():
+        for contact in contacts:
+            legacy_from_address(SENDER)
+            f"whatsapp:{legacy_format_phone_number(contact.whatsapp_number)}"
+
+    def stored_send_path():
+        for contact in contacts:
+            from_address
+            f"whatsapp:{contact.whatsapp_e164}"
+
+    def write_time():
+        for number in numbers:
+            normalize_e164(number)
+
+    legacy = best_per_item(legacy_send_path, len(contacts), args.repeat)
+    stored = best_per_item(stored_send_path, len(contacts), args.repeat)
+    write = best_per_item(write_time, len(numbers), args.repeat)
+
+    print(f"{len(numbers)} numbers, best of {args.repeat}")
+    print(f"{'per-send, normalize each time':>34}: {legacy * 1e9:8.0f} ns")
+    print(f"{'per-send, stored E.164':>34}: {stored * 1e9:8.0f} ns  ({legacy / stored:.1f}x less)")
+    print(f"{'write-time normalize_e164 (once)':>34}: {write * 1e9:8.0f} ns")
+    print(f"Saved per 10k-message run: {(legacy - stored) * 10000 * 1000:.1f} ms of CPU (under the GIL)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,262 @@
+"""
+Benchmark the read API on synthetic contacts, from 10k to 1M rows
+
+For each size a fresh database is seeded with realistic birthdates
+(birth years clustered around the 1980s, a late-summer birth peak, fewer
+births on public holidays, Feb 29 only in leap years). Every endpoint case
+then runs through the Flask test client in a separate interpreter, so
+results do not share caches or memory. Latency percentiles, requests/sec,
+response size, peak Python allocation per request and peak RSS are
+printed and can be written as JSON for comparison across commits.
+
+    python benchmarks/bench_read_api.py [--sizes 10000 100000 1000000] [--requests 50] [--json out.json]
+        [--database-url postgresql://localhost/birthday_bench] [--cases today upcoming_7 ...]
+
+A --database-url database is emptied (all tables dropped) for every size.
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FIRST_NAMES = ['Aarav', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Neha', 'Priya', 'Rahul',
+               'Rohan', 'Saanvi', 'Sara', 'Vihaan', 'Zara', 'James', 'Maria', 'John', 'Sofia', 'David']
+LAST_NAMES = ['Sharma', 'Patel', 'Iyer', 'Reddy', 'Gupta', 'Khan', 'Singh', 'Das', 'Nair', 'Mehta',
+              'Smith', 'Garcia', 'Brown', 'Lopez', 'Wilson']
+
+# Holidays with noticeably fewer (scheduled) births: (month, day) -> weight
+HOLIDAY_WEIGHTS = {(1, 1): 0.7, (12, 24): 0.8, (12, 25): 0.7, (12, 26): 0.85}
+
+HEAVY_CASES = {'contacts_full', 'contacts_ndjson'}
+
+def endpoint_cases(today):
+    """Case name -> (path, headers, clear response cache before each request)"""
+    return {
+        'contacts_full': ('/api/contacts', None, False),
+        'contacts_page': ('/api/contacts?limit=100&cursor={cursor}', None, False),
+        'contacts_prefix': ('/api/contacts?name_prefix=Ka&limit=100', None, False),
+        'contacts_month': (f'/api/contacts?birth_month={today.month}&limit=100', None, False),
+        'contacts_ndjson': ('/api/contacts?format=ndjson', None, False),
+        'today': ('/api/birthdays/today', None, True),
+        'today_cached': ('/api/birthdays/today', None, False),
+        'today_304': ('/api/birthdays/today', 'etag', False),
+        'upcoming_7': ('/api/birthdays/upcoming?days=7', None, True),
+        'upcoming_30': ('/api/birthdays/upcoming?days=30', None, True),
+        'upcoming_30_cached': ('/api/birthdays/upcoming?days=30', None, False),
+        'preview': ('/api/scheduler/preview', None, False),
+    }
+
+def day_of_year_weights():
+    """Relative birth frequency for each (month, day) of a non-leap year"""
+    weights = []
+    day = date(2001, 1, 1)
+    while day.year == 2001:
+        # Births peak around mid-September and dip in spring
+        seasonal = 1.0 + 0.08 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 258) / 365)
+        weights.append(((day.month, day.day), seasonal * HOLIDAY_WEIGHTS.get((day.month, day.day), 1.0)))
+        day += timedelta(days=1)
+    return weights
+
+def generate_contacts(count, seed):
+    """Yield contact column dicts with realistic birthdates"""
+    from utils import get_birthday_key
+
+    rng = random.Random(seed)
+    days = day_of_year_weights()
+    month_days = [month_day for month_day, _ in days]
+    cumulative = []
+    total = 0.0
+    for _, weight in days:
+        total += weight
+        cumulative.append(total)
+    created_at = datetime.utcnow()
+
+    for i in range(count):
+        year = min(2015, max(1930, int(rng.gauss(1985, 15))))
+        month, day = rng.choices(month_days, cum_weights=cumulative)[0]
+        if (month, day) == (2, 28) and year % 4 == 0 and (year % 100 or year % 400 == 0) and rng.random() < 0.5:
+            day = 29
+        birthdate = date(year, month, day)
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        number = f"+91{rng.randrange(6000000000, 9999999999)}"
+        yield {
+            'name': name,
+            'birthdate': birthdate,
+            'birthday_key': get_birthday_key(birthdate),
+            'whatsapp_number': number,
+            'whatsapp_e164': number,
+            'created_at': created_at
+        }
+
+def seed_database(count, seed, batch_size=10000):
+    from app import app, db, Contact, bump_data_version
+    from database import ensure_database_exists
+
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            db.drop_all()
+        ensure_database_exists()
+        start = time.perf_counter()
+        batch = []
+        for row in generate_contacts(count, seed):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.session.execute(Contact.__table__.insert(), batch)
+                batch = []
+        if batch:
+            db.session.execute(Contact.__table__.insert(), batch)
+        bump_data_version('contacts')
+        db.session.commit()
+        return time.perf_counter() - start
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+def run_case(client, name, path, headers, clear_cache, requests, max_cursor):
+    from app import response_cache
+
+    rng = random.Random(name)
+    conditional = {}
+    if headers == 'etag':
+        conditional = {'If-None-Match': client.get(path).headers['ETag']}
+
+    def request():
+        if clear_cache:
+            response_cache.clear()
+        response = client.get(path.format(cursor=rng.randrange(max_cursor)), headers=conditional)
+        body = response.get_data()
+        assert response.status_code in (200, 304), (path, response.status_code)
+        return len(body)
+
+    # Warm up once, then time
+    response_bytes = request()
+    timings = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        request_start = time.perf_counter()
+        request()
+        timings.append(time.perf_counter() - request_start)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    request()
+    peak_alloc = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'case': name,
+        'requests': requests,
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 0.5) * 1000, 3),
+        'p95_ms': round(percentile(timings, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 0.99) * 1000, 3),
+        'requests_per_second': round(requests / elapsed, 1),
+        'response_bytes': response_bytes,
+        'peak_alloc_mb': round(peak_alloc / (1024 * 1024), 2)
+    }
+
+def run_size(args):
+    """Worker mode: seed one database and benchmark every case against it"""
+    import logging
+    logging.disable(logging.WARNING)
+
+    seed_seconds = seed_database(args.size, args.seed)
+
+    from app import app, db
+    from utils import get_local_today
+
+    client = app.test_client()
+    start = time.perf_counter()
+    client.get('/api/birthdays/today')
+    first_request = time.perf_counter() - start
+    with app.app_context():
+        dialect = db.engine.dialect.name
+
+    results = []
+    for name, (path, headers, clear_cache) in endpoint_cases(get_local_today()).items():
+        if args.cases and name not in args.cases:
+            continue
+        requests = args.heavy_requests if name in HEAVY_CASES else args.requests
+        results.append(run_case(client, name, path, headers, clear_cache, requests, args.size))
+
+    print(json.dumps({
+        'contacts': args.size,
+        'database': dialect,
+        'seed_seconds': round(seed_seconds, 2),
+        'first_request_ms': round(first_request * 1000, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'results': results
+    }))
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per case')
+    parser.add_argument('--heavy-requests', type=int, default=3, help='timed requests for full-table cases')
+    parser.add_argument('--cases', nargs='+', help='only run these cases')
+    parser.add_argument('--database-url', help='benchmark against this database instead of scratch SQLite')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.size:
+        run_size(args)
+        return
+
+    runs = []
+    scratch = tempfile.mkdtemp(prefix='bench_read_api_')
+    for size in args.sizes:
+        database_url = args.database_url or f"sqlite:///{os.path.join(scratch, f'contacts_{size}.db')}"
+        command = [sys.executable, os.path.abspath(__file__), '--size', str(size), '--requests', str(args.requests),
+                   '--heavy-requests', str(args.heavy_requests), '--seed', str(args.seed)]
+        if args.cases:
+            command += ['--cases'] + args.cases
+        env = dict(os.environ, DATABASE_URL=database_url, FLASK_ENV='development')
+        env.pop('RENDER', None)
+        completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+        if completed.returncode != 0:
+            sys.stderr.write(completed.stderr)
+            sys.exit(completed.returncode)
+        run = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs.append(run)
+
+        print(f"\n{size} contacts ({run['database']}): seeded in {run['seed_seconds']:.1f}s, "
+              f"first request {run['first_request_ms']:.1f} ms, peak RSS {run['peak_rss_mb']} MB")
+        print(f"{'case':>20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>9} {'bytes':>11} {'alloc MB':>9}")
+        for result in run['results']:
+            print(f"{result['case']:>20} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+                  f"{result['requests_per_second']:>9.1f} {result['response_bytes']:>11} {result['peak_alloc_mb']:>9.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'revision': git_revision(),
+                'python': sys.version.split()[0],
+                'timestamp': datetime.utcnow().isoformat(),
+                'runs': runs
+            }, f, indent=2)
+
+if __name__ == '__main__':
+    main()
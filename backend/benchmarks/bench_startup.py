@@ -0,0 +1,137 @@
+"""
+Measure API cold start: import cost of app.py and time to the first /api/health
+
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--max-import-ms 800]
+
+Each run is a fresh interpreter. The import report comes from
+`python -X importtime -c "import app"`; the health check time runs from
+process spawn to the first 200 from a local dev server. Exits non-zero if
+a module in --forbid gets imported by app.py or the median import time
+exceeds --max-import-ms, so it can guard against import-time regressions.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy modules that should only load on first send or first scheduler use
+DEFAULT_FORBIDDEN = ['twilio', 'apscheduler', 'scheduler_service', 'delivery_ledger', 'send_jobs']
+
+SERVER_SCRIPT = (
+    "import sys; from app import app; "
+    "app.run(host='127.0.0.1', port=int(sys.argv[1]), debug=False, use_reloader=False)"
+)
+
+def run_python(args, **kwargs):
+    return subprocess.run(
+        [sys.executable] + args, cwd=BACKEND_DIR, capture_output=True, text=True, **kwargs
+    )
+
+def parse_importtime(stderr):
+    """Parse -X importtime output into [(module, self_us, cumulative_us, depth)]"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+def app_imports(rows):
+    """Rows imported directly by app.py (importtime lists children before their parent)"""
+    end = next(index for index, row in enumerate(rows) if row[0] == 'app' and row[3] == 0)
+    start = end
+    while start > 0 and rows[start - 1][3] > 0:
+        start -= 1
+    return [row for row in rows[start:end] if row[3] == 1]
+
+def measure_import():
+    result = run_python(['-X', 'importtime', '-c', 'import app'])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return parse_importtime(result.stderr)
+
+def loaded_modules(names):
+    """Which of the given top-level modules end up in sys.modules after importing app"""
+    script = (
+        "import sys, app; "
+        f"print('\\n' + ' '.join(n for n in {names!r} if n in sys.modules))"
+    )
+    result = run_python(['-c', script])
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return result.stdout.splitlines()[-1].split() if result.stdout.strip() else []
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def measure_first_health(timeout=30.0):
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/health"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-c', SERVER_SCRIPT, str(port)], cwd=BACKEND_DIR,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                raise RuntimeError('server exited before answering /api/health')
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError('timed out waiting for /api/health')
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='direct imports of app.py to list')
+    parser.add_argument('--max-import-ms', type=float, default=None)
+    parser.add_argument('--forbid', nargs='*', default=DEFAULT_FORBIDDEN,
+                        help='modules that importing app must not load')
+    args = parser.parse_args()
+
+    import_times = []
+    rows = []
+    for _ in range(args.runs):
+        rows = measure_import()
+        import_times.append(next(cumulative for name, _, cumulative, _ in rows if name == 'app') / 1000)
+    health_times = [measure_first_health() * 1000 for _ in range(args.runs)]
+
+    print(f"import app:           median {statistics.median(import_times):7.1f} ms  (min {min(import_times):.1f}, {args.runs} runs)")
+    print(f"first /api/health:    median {statistics.median(health_times):7.1f} ms  (min {min(health_times):.1f}, {args.runs} runs)")
+
+    print("\nSlowest imports made by app.py (last run):")
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    direct = sorted(app_imports(rows), key=lambda row: row[2], reverse=True)
+    for name, self_us, cumulative_us, _ in direct[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+
+    failed = False
+    leaked = loaded_modules(args.forbid) if args.forbid else []
+    if leaked:
+        print(f"\nFAIL: importing app loads {', '.join(leaked)}")
+        failed = True
+    if args.max_import_ms is not None and statistics.median(import_times) > args.max_import_ms:
+        print(f"\nFAIL: median import time exceeds {args.max_import_ms:.0f} ms")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark the upcoming-birthdays engine and calendar index against the original per-contact loop
+
+Runs in memory on synthetic contacts so it measures the computation only:
+    python benchmarks/bench_upcoming.py [--days 7] [--sizes 10000 100000 1000000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from birthday_index import BirthdayCalendarIndex
+from upcoming_birthdays import build_days_until_table, load_birthday_columns
+from utils import get_birthday_key
+
+def make_contacts(count, seed=42):
+    """Generate (id, birthdate) pairs; a non-leap base year keeps the legacy loop from failing on Feb 29"""
+    rng = random.Random(seed)
+    base = date(2001, 1, 1)
+    years = [year for year in range(1950, 2010) if year % 4]
+    return [
+        (contact_id, (base + timedelta(days=rng.randrange(365))).replace(year=rng.choice(years)))
+        for contact_id in range(1, count + 1)
+    ]
+
+def contact_dict(contact_id, birthdate):
+    return {'id': contact_id, 'birthdate': birthdate.isoformat()}
+
+def legacy_loop(contacts, today, days_ahead):
+    """The original get_next_birthdays algorithm"""
+    upcoming = []
+    for contact_id, birthdate in contacts:
+        try:
+            next_birthday = date(today.year, birthdate.month, birthdate.day)
+            if next_birthday < today:
+                next_birthday = date(today.year + 1, birthdate.month, birthdate.day)
+        except ValueError:
+            next_birthday = date(today.year + 1, birthdate.month, birthdate.day)
+        days_until = (next_birthday - today).days
+        if 0 <= days_until <= days_ahead:
+            upcoming.append({
+                'contact': contact_dict(contact_id, birthdate),
+                'next_birthday': next_birthday.isoformat(),
+                'days_until': days_until
+            })
+    upcoming.sort(key=lambda x: x['days_until'])
+    return upcoming
+
+def select_upcoming(ids, keys, table, days_ahead):
+    """Bucket contact ids by days until their next birthday (a counting sort, no comparisons)"""
+    buckets = [array('q') for _ in range(days_ahead + 1)]
+    for contact_id, days_until in zip(ids, map(table.__getitem__, keys)):
+        if 0 <= days_until <= days_ahead:
+            buckets[days_until].append(contact_id)
+    return buckets
+
+def engine(rows, birthdates, today, days_ahead):
+    """The array-backed engine; birthdates stands in for hydrating matched rows"""
+    table = build_days_until_table(today)
+    ids, keys = load_birthday_columns(rows)
+    upcoming = []
+    for days_until, bucket in enumerate(select_upcoming(ids, keys, table, days_ahead)):
+        next_birthday = (today + timedelta(days=days_until)).isoformat()
+        for contact_id in bucket:
+            upcoming.append({
+                'contact': contact_dict(contact_id, birthdates[contact_id]),
+                'next_birthday': next_birthday,
+                'days_until': days_until
+            })
+    return upcoming
+
+def index_lookup(index, birthdates, today, days_ahead):
+    """A lookup against a prebuilt calendar index"""
+    upcoming = []
+    for days_until, bucket in enumerate(index.upcoming(today, days_ahead)):
+        next_birthday = (today + timedelta(days=days_until)).isoformat()
+        for contact_id in bucket:
+            upcoming.append({
+                'contact': contact_dict(contact_id, birthdates[contact_id]),
+                'next_birthday': next_birthday,
+                'days_until': days_until
+            })
+    return upcoming
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, nargs='+', default=[7, 365])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    today = date.today()
+    print(f"{'contacts':>10} {'days':>5} {'legacy (s)':>11} {'engine (s)':>11} {'index (s)':>10} {'matches':>8}")
+    for size in args.sizes:
+        contacts = make_contacts(size)
+        birthdates = dict(contacts)
+        rows = [(contact_id, get_birthday_key(birthdate)) for contact_id, birthdate in contacts]
+        index = BirthdayCalendarIndex(load_rows=lambda: rows, load_version=lambda: 0, check_interval=float('inf'))
+        index.rebuild()
+        for days_ahead in args.days:
+            legacy_time, legacy_result = best_of(lambda: legacy_loop(contacts, today, days_ahead), args.repeat)
+            engine_time, engine_result = best_of(lambda: engine(rows, birthdates, today, days_ahead), args.repeat)
+            index_time, index_result = best_of(lambda: index_lookup(index, birthdates, today, days_ahead), args.repeat)
+            assert len(legacy_result) == len(engine_result) == len(index_result)
+            print(f"{size:>10} {days_ahead:>5} {legacy_time:>11.3f} {engine_time:>11.3f} "
+                  f"{index_time:>10.3f} {len(engine_result):>8}")
+
+if __name__ == '__main__':
+    main()
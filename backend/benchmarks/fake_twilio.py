@@ -0,0 +1,184 @@
+"""
+Local stand-in for the Twilio Messages API, for benchmarks and load tests
+
+Accepts POST /2010-04-01/Accounts/<sid>/Messages.json and answers like
+Twilio after a configurable latency. It can also fail a share of requests
+with 500s, answer 429 during periodic throttle bursts, and cap accepted
+messages per second (excess requests get 429 with Retry-After).
+GET /__stats returns request counters, including peak requests in flight;
+POST /__reset clears them.
+
+Point the app at it with TWILIO_API_BASE_URL:
+
+    python benchmarks/fake_twilio.py --port 8099 --latency 0.05 --error-rate 0.01 --rate-cap 50
+    TWILIO_API_BASE_URL=http://127.0.0.1:8099 python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FakeTwilioServer:
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, latency_jitter=0.0, error_rate=0.0,
+                 rate_cap=0, burst_every=0.0, burst_length=0.0, seed=None):
+        """
+        latency, latency_jitter: seconds per request (plus up to jitter extra)
+        error_rate: share of requests answered 500
+        rate_cap: messages accepted per second; 0 for no cap
+        burst_every, burst_length: every burst_every seconds, answer 429 for burst_length seconds
+        """
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.error_rate = error_rate
+        self.rate_cap = rate_cap
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.request_count = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.status_counts = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._window = 0
+        self._window_count = 0
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def reset_stats(self):
+        with self._lock:
+            self.request_count = 0
+            self.peak_in_flight = self.in_flight
+            self.status_counts.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'requests': self.request_count,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'status_counts': {str(status): count for status, count in self.status_counts.items()}
+            }
+
+    def _choose_response(self):
+        """Decide the outcome of one request: (status, payload, retry_after)"""
+        now = time.monotonic()
+        with self._lock:
+            if self.burst_every and (now - self._started) % self.burst_every < self.burst_length:
+                return 429, {'code': 20429, 'message': 'Too Many Requests (burst)', 'status': 429}, 1
+            if self.rate_cap:
+                window = int(now)
+                if window != self._window:
+                    self._window, self._window_count = window, 0
+                if self._window_count >= self.rate_cap:
+                    return 429, {'code': 20429, 'message': 'Too Many Requests', 'status': 429}, 1
+                self._window_count += 1
+            if self.error_rate and self._random.random() < self.error_rate:
+                return 500, {'code': 20500, 'message': 'Internal Server Error', 'status': 500}, None
+        return 201, {'sid': 'SM' + uuid.uuid4().hex, 'status': 'queued'}, None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in separate writes; avoid delayed-ACK stalls on keep-alive
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path == '/__stats':
+                    self._reply(200, server.get_stats())
+                else:
+                    self._reply(404, {'code': 20404, 'message': 'Not Found', 'status': 404})
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                if self.path == '/__reset':
+                    server.reset_stats()
+                    self._reply(200, server.get_stats())
+                    return
+                with server._lock:
+                    server.request_count += 1
+                    server.in_flight += 1
+                    server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                try:
+                    time.sleep(server.latency + server._random.uniform(0, server.latency_jitter))
+                    status, payload, retry_after = server._choose_response()
+                    with server._lock:
+                        server.status_counts[status] += 1
+                    self._reply(status, payload, retry_after)
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _reply(self, status, payload, retry_after=None):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if retry_after is not None:
+                    self.send_header('Retry-After', str(retry_after))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def add_server_arguments(parser):
+    """Command-line options for the fake server's behaviour"""
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Twilio latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='up to this many extra seconds per request')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests answered 500')
+    parser.add_argument('--rate-cap', type=int, default=0, help='messages accepted per second (0 = no cap)')
+    parser.add_argument('--burst-every', type=float, default=0.0, help='start a 429 burst every N seconds')
+    parser.add_argument('--burst-length', type=float, default=0.0, help='length of each 429 burst in seconds')
+
+def server_from_arguments(args, **kwargs):
+    return FakeTwilioServer(
+        latency=args.latency, latency_jitter=args.jitter, error_rate=args.error_rate,
+        rate_cap=args.rate_cap, burst_every=args.burst_every, burst_length=args.burst_length, **kwargs
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    server = server_from_arguments(args, host=args.host, port=args.port)
+    print(f"Fake Twilio API listening on {server.base_url} (set TWILIO_API_BASE_URL={server.base_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
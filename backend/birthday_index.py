@@ -0,0 +1,148 @@
+"""
+Process-local birthday calendar index
+
+Contact ids are bucketed into 366 calendar slots (one per birthday key), so
+today and upcoming lookups cost O(days + matches) instead of a table scan.
+The index is built lazily and kept current by the contact CRUD routes; a
+shared change counter in the database tells it when another process has
+written contacts, in which case it rebuilds on the next lookup.
+"""
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from upcoming_birthdays import (
+    ALL_BIRTHDAY_KEYS, BIRTHDAY_KEY_SLOTS, build_days_until_table, load_birthday_columns
+)
+from utils import get_birthday_keys_for_date
+from metrics import BIRTHDAY_LOOKUP_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) to compare against the database change counter
+DEFAULT_CHECK_INTERVAL = float(os.environ.get('BIRTHDAY_INDEX_CHECK_SECONDS', 5))
+
+class BirthdayCalendarIndex:
+    def __init__(self, load_rows, load_version, check_interval=DEFAULT_CHECK_INTERVAL):
+        """
+        load_rows: callable returning (contact_id, birthday_key) rows
+        load_version: callable returning the database contacts change counter
+        """
+        self._load_rows = load_rows
+        self._load_version = load_version
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._slots = None
+        self._size = 0
+        self.generation = 0
+        self.db_version = None
+        self.built_at = None
+        self._checked_at = 0.0
+
+    def rebuild(self):
+        """Reload the whole index from the database (requires an app context)"""
+        with self._lock:
+            started = time.perf_counter()
+            version = self._load_version()
+            ids, keys = load_birthday_columns(self._load_rows())
+            BIRTHDAY_LOOKUP_SECONDS.observe(time.perf_counter() - started, 'index_rebuild')
+            slots = [set() for _ in ALL_BIRTHDAY_KEYS]
+            for contact_id, key in zip(ids, keys):
+                slots[BIRTHDAY_KEY_SLOTS[key]].add(contact_id)
+
+            self._slots = slots
+            self._size = len(ids)
+            self.db_version = version
+            self.built_at = time.time()
+            self._checked_at = time.monotonic()
+            self.generation += 1
+            logger.info(f"Birthday index rebuilt with {self._size} contacts (version {version})")
+
+    def ensure_current(self):
+        """Build the index on first use and rebuild it if the database changed elsewhere"""
+        with self._lock:
+            if self._slots is None:
+                self.rebuild()
+            elif time.monotonic() - self._checked_at >= self.check_interval:
+                self._checked_at = time.monotonic()
+                if self._load_version() != self.db_version:
+                    self.rebuild()
+            return self.generation
+
+    def invalidate(self):
+        """Drop the index so the next lookup rebuilds it"""
+        with self._lock:
+            self._slots = None
+            self.generation += 1
+
+    def add(self, contact_id, key, version=None):
+        """Record a newly created contact"""
+        self.move(contact_id, None, key, version)
+
+    def remove(self, contact_id, key, version=None):
+        """Forget a deleted contact"""
+        self.move(contact_id, key, None, version)
+
+    def move(self, contact_id, old_key, new_key, version=None):
+        """Move a contact between slots after its birthdate changed
+
+        version is the change counter produced by the same transaction; if
+        another process also wrote in between, the next lookup rebuilds.
+        """
+        with self._lock:
+            if self._slots is None:
+                return
+            if old_key is not None:
+                slot = self._slots[BIRTHDAY_KEY_SLOTS[old_key]]
+                if contact_id in slot:
+                    slot.discard(contact_id)
+                    self._size -= 1
+            if new_key is not None:
+                slot = self._slots[BIRTHDAY_KEY_SLOTS[new_key]]
+                if contact_id not in slot:
+                    slot.add(contact_id)
+                    self._size += 1
+
+            if version is not None:
+                if self.db_version is not None and version == self.db_version + 1:
+                    self.db_version = version
+                else:
+                    self._checked_at = 0.0
+            self.generation += 1
+
+    def ids_for_day(self, day):
+        """Get ids of contacts whose birthday is celebrated on the given date"""
+        with self._lock:
+            self.ensure_current()
+            ids = []
+            for key in get_birthday_keys_for_date(day):
+                ids.extend(self._slots[BIRTHDAY_KEY_SLOTS[key]])
+            return sorted(ids)
+
+    def upcoming(self, today, days_ahead):
+        """Get contact ids bucketed by days until their next birthday"""
+        table = build_days_until_table(today)
+        buckets = [[] for _ in range(days_ahead + 1)]
+        with self._lock:
+            self.ensure_current()
+            for offset in range(days_ahead + 1):
+                for key in get_birthday_keys_for_date(today + timedelta(days=offset)):
+                    if table[key] == offset:
+                        buckets[offset].extend(self._slots[BIRTHDAY_KEY_SLOTS[key]])
+        for bucket in buckets:
+            bucket.sort()
+        return buckets
+
+    def get_status(self):
+        """Get index statistics"""
+        with self._lock:
+            return {
+                'built': self._slots is not None,
+                'contact_count': self._size if self._slots is not None else None,
+                'generation': self.generation,
+                'db_version': self.db_version,
+                'built_at': self.built_at
+            }
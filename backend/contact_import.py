@@ -0,0 +1,183 @@
+"""
+Streaming bulk import of contacts from CSV or NDJSON uploads
+
+Rows are read one at a time from the upload stream, validated, and handed
+to the caller in fixed-size batches, so memory stays flat however large
+the file is. Only the first MAX_REPORTED_ERRORS row errors are kept.
+"""
+
+import csv
+import json
+from datetime import datetime
+
+from utils import get_birthday_key
+from phone_numbers import validate_phone_number, normalize_e164
+from local_delivery import is_valid_timezone
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+MAX_REPORTED_ERRORS = 1000
+
+FORMATS = ('csv', 'ndjson')
+
+def detect_format(explicit_format=None, content_type=None, filename=None):
+    """Work out the upload format from a query parameter, content type or filename"""
+    if explicit_format:
+        return explicit_format.lower() if explicit_format.lower() in FORMATS else None
+    content_type = (content_type or '').lower()
+    filename = (filename or '').lower()
+    if 'csv' in content_type or filename.endswith('.csv'):
+        return 'csv'
+    if 'ndjson' in content_type or 'jsonl' in content_type or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return None
+
+def _decode_lines(stream, undecodable):
+    """Decode a binary stream line by line, dropping a leading BOM
+
+    Iterating the stream itself works for every upload object; before
+    Python 3.11, io.TextIOWrapper cannot wrap Werkzeug's spooled upload
+    files, which lack seekable() and readable(). A line that is not UTF-8
+    is decoded with replacement characters and its number added to
+    undecodable, so the row it belongs to can be rejected on its own.
+    """
+    encoding = 'utf-8-sig'
+    for line_number, raw in enumerate(stream, 1):
+        try:
+            line = raw.decode(encoding)
+        except UnicodeDecodeError:
+            undecodable.add(line_number)
+            line = raw.decode(encoding, errors='replace')
+        encoding = 'utf-8'
+        yield line
+
+def iter_rows(stream, file_format):
+    """Yield (row_number, row_dict, error) from a binary upload stream
+
+    A row that cannot be read comes back as (row_number, None, error), and
+    reading carries on with the next row.
+    """
+    undecodable = set()
+    text = _decode_lines(stream, undecodable)
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                undecodable.clear()
+                yield reader.line_num, None, f'Invalid CSV: {str(e)}'
+                continue
+            # The reader only pulls the lines of the row it returns
+            if undecodable:
+                undecodable.clear()
+                yield reader.line_num, None, 'Invalid UTF-8'
+                continue
+            yield reader.line_num, row, None
+    else:
+        for row_number, line in enumerate(text, 1):
+            if row_number in undecodable:
+                yield row_number, None, 'Invalid UTF-8'
+                continue
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield row_number, None, 'Invalid JSON'
+                continue
+            if isinstance(row, dict):
+                yield row_number, row, None
+            else:
+                yield row_number, None, 'Invalid JSON object'
+
+def _text_field(row, field):
+    """A field as stripped text; numbers are taken as text, other non-string values raise ValueError"""
+    value = row.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        raise ValueError(f'{field} must be a string')
+    return str(value).strip()
+
+def parse_contact_row(row):
+    """Validate one row; returns (values, None) or (None, error)"""
+    try:
+        name = _text_field(row, 'name')
+        birthdate = _text_field(row, 'birthdate')
+        whatsapp_number = _text_field(row, 'whatsapp_number')
+        timezone = _text_field(row, 'timezone') or None
+    except ValueError as e:
+        return None, str(e)
+    if not name or not birthdate or not whatsapp_number:
+        return None, 'Missing required fields'
+    if len(name) > 100:
+        return None, 'Name is too long'
+
+    try:
+        birthdate = datetime.strptime(birthdate, '%Y-%m-%d').date()
+    except ValueError:
+        return None, 'Invalid birthdate format. Use YYYY-MM-DD'
+
+    valid, result = validate_phone_number(whatsapp_number)
+    if not valid:
+        return None, result
+
+    if timezone and not is_valid_timezone(timezone):
+        return None, f'Unknown timezone {timezone!r}'
+
+    return {
+        'name': name,
+        'birthdate': birthdate,
+        'birthday_key': get_birthday_key(birthdate),
+        'whatsapp_number': result,
+        'whatsapp_e164': normalize_e164(result) or None,
+        'timezone': timezone,
+        'created_at': datetime.utcnow()
+    }, None
+
+def import_contacts(stream, file_format, insert_batch, batch_size=DEFAULT_BATCH_SIZE):
+    """Import contacts from an upload stream
+
+    insert_batch(rows) inserts and commits one batch of column dicts and
+    raises on failure, in which case that batch is reported as failed.
+    Returns a report with counts and per-row errors.
+    """
+    report = {'total_rows': 0, 'imported': 0, 'failed': 0, 'errors': [], 'errors_truncated': False}
+    batch = []
+    batch_rows = []
+
+    def add_error(row_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': error})
+        else:
+            report['errors_truncated'] = True
+
+    def flush():
+        try:
+            insert_batch(batch)
+            report['imported'] += len(batch)
+        except Exception as e:
+            for row_number in batch_rows:
+                add_error(row_number, f'Database error: {str(e)}')
+        batch.clear()
+        batch_rows.clear()
+
+    for row_number, row, error in iter_rows(stream, file_format):
+        report['total_rows'] += 1
+        if not error:
+            values, error = parse_contact_row(row)
+        if error:
+            add_error(row_number, error)
+            continue
+        batch.append(values)
+        batch_rows.append(row_number)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+    return report
@@ -1,15 +1,107 @@
+import logging
 import os
-from app import app, db, Contact, Settings
+from app import app, db, Contact, Settings, bump_data_version
+from utils import get_birthday_key
+from phone_numbers import normalize_e164
+
+logger = logging.getLogger(__name__)
+
+# Columns added after the initial schema: (table, column, SQL type, indexed)
+ADDED_COLUMNS = [
+    ('contact', 'birthday_key', 'INTEGER', True),
+    ('contact', 'whatsapp_e164', 'VARCHAR(20)', True),
+    ('contact', 'timezone', 'VARCHAR(64)', False),
+    ('settings', 'message_template_set', 'VARCHAR(50)', False),
+    ('message_delivery', 'error_class', 'VARCHAR(20)', False),
+    ('message_delivery', 'next_attempt_at', 'TIMESTAMP', True),
+]
 
 def init_db():
     """Initialize the database with tables"""
     try:
         with app.app_context():
             db.create_all()
-            print("Database tables created successfully!")
+            logger.info("Database tables created successfully!")
+            return True
+    except Exception as e:
+        logger.error(f"Error initializing database: {str(e)}")
+        return False
+
+def ensure_added_columns():
+    """Add columns introduced after the initial schema to existing tables"""
+    try:
+        with app.app_context():
+            inspector = db.inspect(db.engine)
+            for table, column, column_type, indexed in ADDED_COLUMNS:
+                existing = {c['name'] for c in inspector.get_columns(table)}
+                if column in existing:
+                    continue
+                with db.engine.begin() as conn:
+                    conn.execute(db.text(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}'))
+                    if indexed:
+                        conn.execute(db.text(
+                            f'CREATE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})'
+                        ))
+                logger.info(f"Added column {table}.{column}")
+            return True
+    except Exception as e:
+        logger.error(f"Error adding new columns: {str(e)}")
+        return False
+
+def backfill_birthday_keys(batch_size=1000):
+    """Populate Contact.birthday_key for rows created before the column existed"""
+    try:
+        with app.app_context():
+            updated = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(Contact.id, Contact.birthdate).filter(
+                    Contact.id > last_id,
+                    Contact.birthday_key.is_(None)
+                ).order_by(Contact.id).limit(batch_size).all()
+                if not rows:
+                    break
+                db.session.bulk_update_mappings(Contact, [
+                    {'id': row.id, 'birthday_key': get_birthday_key(row.birthdate)}
+                    for row in rows
+                ])
+                db.session.commit()
+                last_id = rows[-1].id
+                updated += len(rows)
+            if updated:
+                bump_data_version('contacts')
+                db.session.commit()
+                logger.info(f"Backfilled birthday keys for {updated} contacts")
+            return True
+    except Exception as e:
+        logger.error(f"Error backfilling birthday keys: {str(e)}")
+        return False
+
+def backfill_whatsapp_e164(batch_size=1000):
+    """Populate Contact.whatsapp_e164 for rows created before the column existed"""
+    try:
+        with app.app_context():
+            updated = 0
+            last_id = 0
+            while True:
+                rows = db.session.query(Contact.id, Contact.whatsapp_number).filter(
+                    Contact.id > last_id,
+                    Contact.whatsapp_e164.is_(None)
+                ).order_by(Contact.id).limit(batch_size).all()
+                if not rows:
+                    break
+                db.session.bulk_update_mappings(Contact, [
+                    {'id': row.id, 'whatsapp_e164': normalize_e164(row.whatsapp_number) or None}
+                    for row in rows
+                ])
+                db.session.commit()
+                last_id = rows[-1].id
+                updated += len(rows)
+            if updated:
+                logger.info(f"Backfilled E.164 numbers for {updated} contacts")
             return True
     except Exception as e:
-        print(f"Error initializing database: {str(e)}")
+        logger.error(f"Error backfilling E.164 numbers: {str(e)}")
         return False
 
 def add_sample_data():
@@ -18,7 +110,7 @@ def add_sample_data():
         with app.app_context():
             # Check if data already exists
             if Contact.query.first():
-                print("Sample data already exists!")
+                logger.info("Sample data already exists!")
                 return True
             
             from datetime import date
@@ -43,10 +135,10 @@ def add_sample_data():
             db.session.add(default_settings)
             
             db.session.commit()
-            print("Sample data added successfully!")
+            logger.info("Sample data added successfully!")
             return True
     except Exception as e:
-        print(f"Error adding sample data: {str(e)}")
+        logger.error(f"Error adding sample data: {str(e)}")
         return False
 
 def ensure_database_exists():
@@ -55,11 +147,14 @@ def ensure_database_exists():
     is_production = os.environ.get('RENDER') or os.environ.get('FLASK_ENV') == 'production'
     
     if init_db():
+        ensure_added_columns()
+        backfill_birthday_keys()
+        backfill_whatsapp_e164()
         if not is_production:
             add_sample_data()
-            print("Development database initialized with sample data")
+            logger.info("Development database initialized with sample data")
         else:
-            print("Production database initialized without sample data")
+            logger.info("Production database initialized without sample data")
         return True
     return False
 
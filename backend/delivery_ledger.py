@@ -0,0 +1,276 @@
+"""
+Delivery ledger for idempotent birthday sends
+
+Every send is claimed in the ledger before it goes out, keyed on
+(delivery_date, kind, contact_id), so daily, interval and manual runs never
+message the same contact twice for the same occasion. Claims are atomic
+across processes: new rows rely on the unique constraint and retries on a
+conditional status update.
+
+Failures that may succeed later (throttling, Twilio 5xx, network errors)
+move to the retry queue with exponential backoff; permanent failures and
+rows that run out of attempts become dead letters.
+"""
+
+import logging
+import os
+import random
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError
+
+from app import db, MessageDelivery
+from dispatch import dispatch_birthday_messages
+from message_templates import render_birthday_batch
+from sender_pool import plan_batch
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+STATUS_RETRY = 'retry'
+STATUS_DEAD = 'dead'
+
+# A pending claim older than this is assumed to belong to a crashed run
+STALE_CLAIM_MINUTES = 15
+
+# Error classes worth retrying; anything else (e.g. invalid_number) goes straight to dead letters
+RETRYABLE_ERRORS = {'throttled', 'server_error', 'network'}
+
+RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', 5))
+RETRY_BASE_SECONDS = float(os.environ.get('RETRY_BASE_SECONDS', 60))
+RETRY_MAX_SECONDS = float(os.environ.get('RETRY_MAX_SECONDS', 3600))
+
+# A claimed ledger row: its id and the attempt number this send represents
+Claim = namedtuple('Claim', ['id', 'attempts'])
+
+def get_retry_delay(attempts):
+    """Exponential backoff with jitter: half the delay is fixed, half random"""
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, attempts - 1)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+def claim_deliveries(contact_ids, delivery_date, kind='birthday', chunk_size=500):
+    """Claim ledger rows for the given contacts
+
+    Returns {contact_id: Claim} for the contacts this caller may send to;
+    contacts already sent, queued for retry, dead, or claimed by another run
+    are left out.
+    """
+    now = datetime.utcnow()
+    stale_before = now - timedelta(minutes=STALE_CLAIM_MINUTES)
+    claimed = {}
+    contact_ids = list(contact_ids)
+
+    for start in range(0, len(contact_ids), chunk_size):
+        chunk = contact_ids[start:start + chunk_size]
+        existing = {
+            row.contact_id: row for row in db.session.query(
+                MessageDelivery.id, MessageDelivery.contact_id, MessageDelivery.status,
+                MessageDelivery.attempts, MessageDelivery.updated_at
+            ).filter(
+                MessageDelivery.delivery_date == delivery_date,
+                MessageDelivery.kind == kind,
+                MessageDelivery.contact_id.in_(chunk)
+            )
+        }
+
+        for contact_id in chunk:
+            row = existing.get(contact_id)
+            if row is None:
+                delivery = MessageDelivery(
+                    contact_id=contact_id, delivery_date=delivery_date, kind=kind,
+                    status=STATUS_PENDING, attempts=1, updated_at=now
+                )
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(delivery)
+                    claimed[contact_id] = Claim(delivery.id, 1)
+                except IntegrityError:
+                    # Another run inserted the row first
+                    pass
+            elif row.status == STATUS_FAILED or (row.status == STATUS_PENDING and row.updated_at < stale_before):
+                updated = MessageDelivery.query.filter(
+                    MessageDelivery.id == row.id,
+                    MessageDelivery.status == row.status,
+                    MessageDelivery.updated_at == row.updated_at
+                ).update({
+                    MessageDelivery.status: STATUS_PENDING,
+                    MessageDelivery.attempts: MessageDelivery.attempts + 1,
+                    MessageDelivery.updated_at: now
+                }, synchronize_session=False)
+                if updated:
+                    claimed[contact_id] = Claim(row.id, row.attempts + 1)
+
+    db.session.commit()
+    return claimed
+
+def get_delivery_rows(contact_ids, delivery_date, kind='birthday', chunk_size=500):
+    """Ledger rows for contact_ids on delivery_date, as {contact_id: row}
+
+    Each row has status, last_message, error_class and updated_at.
+    """
+    contact_ids = list(contact_ids)
+    rows = {}
+    for start in range(0, len(contact_ids), chunk_size):
+        chunk = contact_ids[start:start + chunk_size]
+        rows.update((row.contact_id, row) for row in db.session.query(
+            MessageDelivery.contact_id, MessageDelivery.status, MessageDelivery.last_message,
+            MessageDelivery.error_class, MessageDelivery.updated_at
+        ).filter(
+            MessageDelivery.delivery_date == delivery_date,
+            MessageDelivery.kind == kind,
+            MessageDelivery.contact_id.in_(chunk)
+        ))
+    return rows
+
+def queue_unfinished_sends(contact_ids, delivery_date, message, kind='birthday', chunk_size=500):
+    """Hand the contacts of a run that died part-way to the retry queue
+
+    Claims it left pending are queued for an immediate retry, or become
+    dead letters once out of attempts, and contacts it never claimed get a
+    retry row. Rows already sent, queued or dead are left alone. Returns
+    the number of rows queued or moved.
+    """
+    now = datetime.utcnow()
+    values = {
+        MessageDelivery.last_message: message,
+        MessageDelivery.error_class: 'dispatch_error',
+        MessageDelivery.updated_at: now
+    }
+    contact_ids = list(contact_ids)
+    queued = 0
+    for start in range(0, len(contact_ids), chunk_size):
+        chunk = contact_ids[start:start + chunk_size]
+        rows = MessageDelivery.query.filter(
+            MessageDelivery.delivery_date == delivery_date,
+            MessageDelivery.kind == kind,
+            MessageDelivery.contact_id.in_(chunk)
+        )
+        pending = rows.filter(MessageDelivery.status == STATUS_PENDING)
+        queued += pending.filter(MessageDelivery.attempts < RETRY_MAX_ATTEMPTS).update(
+            {**values, MessageDelivery.status: STATUS_RETRY, MessageDelivery.next_attempt_at: now},
+            synchronize_session=False
+        )
+        queued += pending.update({**values, MessageDelivery.status: STATUS_DEAD}, synchronize_session=False)
+
+        existing = {contact_id for contact_id, in rows.with_entities(MessageDelivery.contact_id)}
+        for contact_id in chunk:
+            if contact_id in existing:
+                continue
+            delivery = MessageDelivery(
+                contact_id=contact_id, delivery_date=delivery_date, kind=kind, status=STATUS_RETRY,
+                attempts=0, last_message=message, error_class='dispatch_error', next_attempt_at=now, updated_at=now
+            )
+            try:
+                with db.session.begin_nested():
+                    db.session.add(delivery)
+                queued += 1
+            except IntegrityError:
+                # Another run claimed the contact meanwhile
+                pass
+    db.session.commit()
+    return queued
+
+def force_claim_delivery(contact_id, delivery_date, kind='birthday'):
+    """Claim a contact's ledger row whatever its status, for an explicitly forced send
+
+    The row is created if missing, otherwise moved back to pending with one
+    more attempt, so the forced send's outcome is recorded like any other.
+    Returns {contact_id: Claim}.
+    """
+    now = datetime.utcnow()
+    while True:
+        row = db.session.query(MessageDelivery.id, MessageDelivery.attempts).filter(
+            MessageDelivery.delivery_date == delivery_date,
+            MessageDelivery.kind == kind,
+            MessageDelivery.contact_id == contact_id
+        ).first()
+        if row is not None:
+            break
+        delivery = MessageDelivery(
+            contact_id=contact_id, delivery_date=delivery_date, kind=kind,
+            status=STATUS_PENDING, attempts=1, updated_at=now
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(delivery)
+            db.session.commit()
+            return {contact_id: Claim(delivery.id, 1)}
+        except IntegrityError:
+            # Another run inserted the row first; take it over instead
+            pass
+
+    MessageDelivery.query.filter(MessageDelivery.id == row.id).update({
+        MessageDelivery.status: STATUS_PENDING,
+        MessageDelivery.attempts: MessageDelivery.attempts + 1,
+        MessageDelivery.next_attempt_at: None,
+        MessageDelivery.updated_at: now
+    }, synchronize_session=False)
+    db.session.commit()
+    return {contact_id: Claim(row.id, row.attempts + 1)}
+
+def record_deliveries(claimed, outcomes):
+    """Store send outcomes for claimed rows
+
+    outcomes: iterable of (contact_id, success, message, error_class)
+    """
+    now = datetime.utcnow()
+    mappings = []
+    for contact_id, success, message, error_class in outcomes:
+        claim = claimed.get(contact_id)
+        if claim is None:
+            continue
+        mapping = {
+            'id': claim.id,
+            'last_message': message,
+            'error_class': error_class,
+            'next_attempt_at': None,
+            'updated_at': now
+        }
+        if success:
+            mapping['status'] = STATUS_SENT
+        elif error_class in RETRYABLE_ERRORS and claim.attempts < RETRY_MAX_ATTEMPTS:
+            mapping['status'] = STATUS_RETRY
+            mapping['next_attempt_at'] = now + timedelta(seconds=get_retry_delay(claim.attempts))
+        else:
+            mapping['status'] = STATUS_DEAD
+            logger.warning(f"Delivery {claim.id} moved to dead letters after {claim.attempts} attempt(s): {message}")
+        mappings.append(mapping)
+
+    db.session.bulk_update_mappings(MessageDelivery, mappings)
+    db.session.commit()
+
+def send_birthday_batch(whatsapp_service, contacts, wisher_name, delivery_date, max_workers=None,
+                        template_set=None):
+    """Send birthday messages to contacts not yet messaged for delivery_date
+
+    Bodies are rendered for the whole batch up front from template_set,
+    and contacts are spread across the sender pool when one is configured.
+    Returns (results, skipped_count); results use the dispatch result shape.
+    """
+    claimed = claim_deliveries([contact.id for contact in contacts], delivery_date)
+    to_send = [contact for contact in contacts if contact.id in claimed]
+    skipped_count = len(contacts) - len(to_send)
+    if skipped_count:
+        logger.info(f"Skipping {skipped_count} contact(s) already messaged for {delivery_date.isoformat()}")
+
+    bodies = render_birthday_batch(to_send, wisher_name, delivery_date, template_set)
+    pool, assignments, services = plan_batch(whatsapp_service, to_send, delivery_date)
+    started = time.perf_counter()
+    results = dispatch_birthday_messages(
+        whatsapp_service,
+        [(contact.name, contact.send_number, body) for contact, body in zip(to_send, bodies)],
+        wisher_name,
+        max_workers=max_workers,
+        services=services
+    )
+    if pool:
+        pool.record_results(assignments, results, delivery_date, time.perf_counter() - started)
+    record_deliveries(claimed, [
+        (contact.id, result['success'], result['message'], result['error_class'])
+        for contact, result in zip(to_send, results)
+    ])
+    return results, skipped_count
@@ -0,0 +1,75 @@
+"""
+Concurrent dispatch of birthday messages with a bounded worker pool
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent senders per dispatch run
+DEFAULT_MAX_WORKERS = int(os.environ.get('DISPATCH_MAX_WORKERS', 8))
+
+# Hard cap on Twilio requests in flight across all runs in this process
+MAX_IN_FLIGHT = int(os.environ.get('DISPATCH_MAX_IN_FLIGHT', 16))
+
+_in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+
+def dispatch(items, send, max_workers=None):
+    """Call send(item) for every item on a bounded thread pool
+
+    Results are returned in the same order as items. At most max_workers
+    sends run at once per call, at most MAX_IN_FLIGHT across the process,
+    and only a small window of items is queued ahead of the workers.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    workers = max(1, min(max_workers or DEFAULT_MAX_WORKERS, MAX_IN_FLIGHT, len(items) or 1))
+
+    def run(index, item):
+        with _in_flight:
+            results[index] = send(item)
+
+    if workers == 1:
+        for index, item in enumerate(items):
+            run(index, item)
+        return results
+
+    window = threading.BoundedSemaphore(workers * 2)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dispatch') as pool:
+        for index, item in enumerate(items):
+            window.acquire()
+            future = pool.submit(run, index, item)
+            future.add_done_callback(lambda _: window.release())
+    return results
+
+def dispatch_birthday_messages(whatsapp_service, recipients, wisher_name, max_workers=None, services=None):
+    """Send birthday messages to (name, E.164 number, body) recipients concurrently
+
+    A body of None is rendered by the service from the default template.
+    services optionally gives each recipient its own sender's service.
+    Returns one result dict per recipient, in order, in the shape used by
+    the send-birthday-messages API plus the failure's error_class.
+    """
+    def send(item):
+        (name, number, body), service = item
+        try:
+            success, message, error_class = service.deliver_birthday_message(
+                name, number, wisher_name, message_body=body
+            )
+        except Exception as e:
+            success, message, error_class = False, f"Unexpected error: {str(e)}", 'unexpected'
+        return {
+            'contact_name': name,
+            'contact_number': number,
+            'success': success,
+            'message': message,
+            'error_class': error_class
+        }
+
+    if services is None:
+        services = repeat(whatsapp_service)
+    return dispatch(zip(recipients, services), send, max_workers)
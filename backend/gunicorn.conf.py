@@ -0,0 +1,27 @@
+"""
+Gunicorn hooks for the API
+
+Importing the app leaves the scheduler alone. Each worker joins the
+scheduler lease here once it has loaded the app, through a lightweight
+watcher, and only the worker that wins the lease builds the scheduler
+(APScheduler, its job store and the send path). The jobs stored in the
+database then keep running after a deploy or restart, without waiting
+for a /api/scheduler/* request, and standby workers keep a cheap start.
+"""
+
+def _start_scheduler():
+    from scheduler_service import get_scheduler
+    get_scheduler()
+
+def post_worker_init(worker):
+    from scheduler_lease import SCHEDULER_LEASE_NAME, watch_lease
+    watch_lease(SCHEDULER_LEASE_NAME, _start_scheduler)
+
+def worker_exit(server, worker):
+    # Hand the lease to another worker now rather than when it expires
+    from scheduler_lease import SCHEDULER_LEASE_NAME, take_watched_lease
+    lease = take_watched_lease(SCHEDULER_LEASE_NAME)
+    if lease is not None:
+        lease.release()
+    from scheduler_service import shutdown_scheduler
+    shutdown_scheduler()
@@ -0,0 +1,168 @@
+"""
+Birthday delivery at a fixed local time in each contact's own timezone
+
+Contacts with a timezone get their message at the send time on their local
+birthday; the rest use SCHEDULER_TIMEZONE. Instead of one scheduler job per
+send time, upcoming sends are planned into a min-heap of delivery slots,
+each holding the contacts due at one instant (rounded down to
+DELIVERY_SLOT_SECONDS). A single scheduler job ticks every
+DELIVERY_TICK_SECONDS and sends the slots that have come due, so the day's
+volume is spread over the hours the contacts' timezones cover.
+
+The plan covers the next DELIVERY_PLAN_HOURS and is rebuilt when half of
+it has passed, when contacts change, or when the send time changes. A new
+plan starts where the last tick stopped, or catch_up_seconds back for a
+fresh process, so a new scheduler leader re-sends recent slots and the
+delivery ledger skips the contacts already sent.
+"""
+
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, time as dt_time, timedelta
+from functools import lru_cache
+
+import pytz
+
+logger = logging.getLogger(__name__)
+
+DELIVERY_TICK_SECONDS = int(os.environ.get('DELIVERY_TICK_SECONDS', 30))
+DELIVERY_SLOT_SECONDS = int(os.environ.get('DELIVERY_SLOT_SECONDS', 60))
+DELIVERY_PLAN_HOURS = float(os.environ.get('DELIVERY_PLAN_HOURS', 6))
+
+# Timezone offsets span UTC-12 to UTC+14, so a UTC window touches local dates one day either side
+_MAX_OFFSET_DAYS = 1
+
+def is_valid_timezone(name):
+    """True if name is an IANA timezone name pytz knows"""
+    return name in pytz.all_timezones_set
+
+@lru_cache(maxsize=1024)
+def get_timezone(name, default_name):
+    """pytz timezone for a contact's timezone name, or the default for empty or unknown names"""
+    if name and is_valid_timezone(name):
+        return pytz.timezone(name)
+    return pytz.timezone(default_name)
+
+def local_send_time(day, tz, hour, minute):
+    """UTC instant of hour:minute local time on day in tz
+
+    A send time skipped by a DST change resolves to the standard-time
+    reading, as pytz's localize does.
+    """
+    return tz.localize(datetime.combine(day, dt_time(hour, minute))).astimezone(pytz.utc)
+
+class DeliveryWheel:
+    """Min-heap of delivery slots keyed by (fire timestamp, delivery date)"""
+
+    def __init__(self, slot_seconds=DELIVERY_SLOT_SECONDS):
+        self.slot_seconds = slot_seconds
+        self._heap = []
+        self._slots = {}
+        self.contact_count = 0
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add(self, fire_at, delivery_date, contact_id):
+        """Put a contact in the slot containing fire_at (a UTC timestamp)"""
+        key = (int(fire_at // self.slot_seconds) * self.slot_seconds, delivery_date)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots[key] = []
+            heapq.heappush(self._heap, key)
+        slot.append(contact_id)
+        self.contact_count += 1
+
+    def pop_due(self, now):
+        """Remove and return [(fire timestamp, delivery date, contact ids)] due at now, earliest first"""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            key = heapq.heappop(self._heap)
+            contact_ids = self._slots.pop(key)
+            self.contact_count -= len(contact_ids)
+            due.append((key[0], key[1], contact_ids))
+        return due
+
+    def next_fire(self):
+        """Timestamp of the earliest pending slot, or None"""
+        return self._heap[0][0] if self._heap else None
+
+class LocalTimeDelivery:
+    """Plans each contact's local send time into a DeliveryWheel and returns due slots per tick"""
+
+    def __init__(self, load_contacts, load_version, default_timezone, catch_up_seconds,
+                 plan_hours=DELIVERY_PLAN_HOURS, slot_seconds=DELIVERY_SLOT_SECONDS):
+        """
+        load_contacts: callable(day) returning (contact_id, timezone name) rows with a birthday on day
+        load_version: callable returning the database contacts change counter
+        """
+        self._load_contacts = load_contacts
+        self._load_version = load_version
+        self.default_timezone = default_timezone
+        self.catch_up = timedelta(seconds=catch_up_seconds)
+        self.plan_span = timedelta(hours=plan_hours)
+        self.slot_seconds = slot_seconds
+        self._lock = threading.Lock()
+        self._wheel = DeliveryWheel(slot_seconds)
+        self._send_time = None
+        self._version = None
+        self._planned_until = None
+        self._fired_until = None
+
+    def _needs_plan(self, send_time, version, now):
+        return (
+            self._planned_until is None
+            or send_time != self._send_time
+            or version != self._version
+            or now + self.plan_span / 2 >= self._planned_until
+        )
+
+    def _plan(self, send_time, version, now):
+        hour, minute = send_time
+        start = now - self.catch_up
+        if self._fired_until is not None and self._fired_until > start:
+            start = self._fired_until
+        end = now + self.plan_span
+
+        wheel = DeliveryWheel(self.slot_seconds)
+        day = start.date() - timedelta(days=_MAX_OFFSET_DAYS)
+        last_day = end.date() + timedelta(days=_MAX_OFFSET_DAYS)
+        while day <= last_day:
+            for contact_id, timezone_name in self._load_contacts(day):
+                fire_at = local_send_time(day, get_timezone(timezone_name, self.default_timezone), hour, minute)
+                if start < fire_at <= end:
+                    wheel.add(fire_at.timestamp(), day, contact_id)
+            day += timedelta(days=1)
+
+        self._wheel = wheel
+        self._send_time = send_time
+        self._version = version
+        self._planned_until = end
+        logger.info(
+            f"Planned {wheel.contact_count} local-time send(s) in {len(wheel)} slot(s) "
+            f"until {end.isoformat()} for {hour:02d}:{minute:02d} local"
+        )
+
+    def tick(self, hour, minute, now=None):
+        """Return the slots due now as [(fire datetime, delivery date, contact ids)], replanning if needed"""
+        now = now or datetime.now(pytz.utc)
+        version = self._load_version()
+        with self._lock:
+            if self._needs_plan((hour, minute), version, now):
+                self._plan((hour, minute), version, now)
+            due = self._wheel.pop_due(now.timestamp())
+            self._fired_until = now
+        return [(datetime.fromtimestamp(fire_at, pytz.utc), day, contact_ids) for fire_at, day, contact_ids in due]
+
+    def get_status(self):
+        with self._lock:
+            next_fire = self._wheel.next_fire()
+            return {
+                'send_time': f"{self._send_time[0]:02d}:{self._send_time[1]:02d}" if self._send_time else None,
+                'pending_slots': len(self._wheel),
+                'pending_contacts': self._wheel.contact_count,
+                'next_slot': datetime.fromtimestamp(next_fire, pytz.utc).isoformat() if next_fire is not None else None,
+                'planned_until': self._planned_until.isoformat() if self._planned_until else None
+            }
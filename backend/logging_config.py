@@ -0,0 +1,146 @@
+"""
+Queue-based logging setup shared by the API and the scheduler service
+
+Loggers only put records on an in-memory queue; a QueueListener thread
+formats them and does the console and file I/O, so a slow disk never
+stalls the send loop. Records are plain text or one JSON object per line
+(LOG_FORMAT=json), and the optional log file rotates by size, or by time
+when LOG_ROTATE_WHEN is set.
+
+Repetitive success lines are logged with extra=SAMPLED and kept at
+LOG_SUCCESS_SAMPLE_RATE (default 1.0, keep all). Dropped records are
+discarded before they are formatted or queued; warnings and errors are
+never sampled.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+LOG_FILE = os.environ.get('LOG_FILE', '')
+
+# Size-based rotation, unless LOG_ROTATE_WHEN (e.g. 'midnight', 'H') selects time-based rotation
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', '')
+
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Pass as extra= on high-volume success lines to make them subject to sampling
+SAMPLED = {'sampled': True}
+
+# LogRecord attributes that are not user-supplied extras
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sampled'}
+
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """Format records as single-line JSON objects, including any extra fields"""
+
+    def format(self, record):
+        payload = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, default=str)
+
+class SuccessSampler(logging.Filter):
+    """Keep a fraction of records marked sampled; pass everything else"""
+
+    def __init__(self, rate=LOG_SUCCESS_SAMPLE_RATE):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1 or not getattr(record, 'sampled', False):
+            return True
+        return random.random() < self.rate
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge args and render tracebacks now, while they are still valid,
+        # but leave the formatting itself to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def _create_formatter(log_format):
+    return JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+def _create_file_handler(path):
+    if LOG_ROTATE_WHEN:
+        return logging.handlers.TimedRotatingFileHandler(path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT)
+
+def configure_logging(log_file=None, log_format=None, level=None):
+    """Route the root logger through a queue to console (and file) handlers
+
+    Only the first call configures logging, so an entry point such as
+    run_scheduler.py can set up its log file before importing the app.
+    """
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        formatter = _create_formatter(log_format or LOG_FORMAT)
+        handlers = [logging.StreamHandler(sys.stderr)]
+        log_file = log_file or LOG_FILE
+        if log_file:
+            handlers.append(_create_file_handler(log_file))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _queue_handler = _QueueHandler(log_queue)
+        _queue_handler.addFilter(SuccessSampler())
+
+        root = logging.getLogger()
+        root.setLevel(level or LOG_LEVEL)
+        root.addHandler(_queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener, _queue_handler
+    with _lock:
+        if _listener is None:
+            return
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = _queue_handler = None
@@ -1,9 +1,75 @@
 """
 Message templates for birthday wishes and other notifications
+
+Templates are compiled once into %-format strings, so rendering is a
+single C-level formatting call. Birthday templates are grouped into named
+sets; the settings' message_template_set picks the account's set, and the
+template within a set is chosen per contact by a hash of the contact id
+and delivery date, so a contact gets the same message on previews,
+sends and retries for that day. render_birthday_batch renders a whole
+day in one pass and shares identical bodies between contacts.
 """
 
+import random
+import zlib
+from string import Formatter
+
+# Fields a birthday template may use
+TEMPLATE_FIELDS = ('name', 'first_name', 'wisher')
+
+class CompiledTemplate:
+    """A str.format-style template compiled to a %-format string"""
+    __slots__ = ('text', 'fields', '_format')
+
+    def __init__(self, text):
+        self.text = text
+        pieces = []
+        fields = []
+        for literal, field_name, format_spec, conversion in Formatter().parse(text):
+            pieces.append(literal.replace('%', '%%'))
+            if field_name is not None:
+                if format_spec or conversion:
+                    raise ValueError(f"Template field {{{field_name}}} may not use a format spec or conversion")
+                pieces.append('%s')
+                fields.append(field_name)
+        self.fields = tuple(fields)
+        # Templates without fields render to the same string object every time
+        self._format = ''.join(pieces) if fields else text
+
+    def render(self, values):
+        """Render with a dict of field values"""
+        if not self.fields:
+            return self._format
+        return self._format % tuple(values[field] for field in self.fields)
+
+class TemplateSet:
+    """Named list of birthday templates with deterministic per-contact selection"""
+
+    def __init__(self, name, templates):
+        if not templates:
+            raise ValueError(f"Template set {name!r} is empty")
+        self.name = name
+        self.templates = tuple(CompiledTemplate(text) for text in templates)
+        for template in self.templates:
+            unknown = set(template.fields) - set(TEMPLATE_FIELDS)
+            if unknown:
+                raise ValueError(f"Template set {name!r} uses unknown field(s): {', '.join(sorted(unknown))}")
+
+    def select(self, contact_id, day):
+        """Template for a contact on a delivery date (the first one without a contact)"""
+        if len(self.templates) == 1 or contact_id is None:
+            return self.templates[0]
+        seed = f"{contact_id}:{day.isoformat() if day else ''}".encode('ascii')
+        return self.templates[zlib.crc32(seed) % len(self.templates)]
+
 class MessageTemplates:
     
+    # The business-specified wording every birthday message used before template sets
+    BUSINESS_MESSAGE = (
+        "Hi there! This is Ribbon & Balloons with Asha Traders, and today’s a super special day – it’s your Birthday! "
+        "Wishing you loads of happiness, laughter, and sweet surprises. Happiest Birthday from all of us to you!"
+    )
+    
     BIRTHDAY_MESSAGES = [
         "🎉 Happy Birthday {name}! 🎂\n\nWishing you a wonderful day filled with happiness and joy!\n\n– from {wisher}",
         "🎈 Happy Birthday {name}! 🎉\n\nHope your special day is amazing and the year ahead brings you lots of happiness!\n\n– from {wisher}",
@@ -16,27 +82,70 @@ class MessageTemplates:
     
     REMINDER_MESSAGE = "📅 Birthday Reminder!\n\n{name}'s birthday is coming up on {date}. Don't forget to wish them well!\n\n– Birthday Reminder App"
     
+    _COMPILED_BIRTHDAY = [CompiledTemplate(text) for text in BIRTHDAY_MESSAGES]
+    _COMPILED_TEST = CompiledTemplate(TEST_MESSAGE)
+    _COMPILED_REMINDER = CompiledTemplate(REMINDER_MESSAGE)
+    
     @classmethod
     def get_birthday_message(cls, name, wisher, template_index=0):
         """Get a formatted birthday message"""
-        if template_index >= len(cls.BIRTHDAY_MESSAGES):
+        if template_index >= len(cls._COMPILED_BIRTHDAY):
             template_index = 0
         
-        return cls.BIRTHDAY_MESSAGES[template_index].format(name=name, wisher=wisher)
+        return cls._COMPILED_BIRTHDAY[template_index].render({'name': name, 'wisher': wisher})
     
     @classmethod
     def get_test_message(cls, wisher):
         """Get a formatted test message"""
-        return cls.TEST_MESSAGE.format(wisher=wisher)
+        return cls._COMPILED_TEST.render({'wisher': wisher})
     
     @classmethod
     def get_reminder_message(cls, name, date):
         """Get a formatted reminder message"""
-        return cls.REMINDER_MESSAGE.format(name=name, date=date)
+        return cls._COMPILED_REMINDER.render({'name': name, 'date': date})
     
     @classmethod
     def get_random_birthday_message(cls, name, wisher):
         """Get a random birthday message"""
-        import random
-        template_index = random.randint(0, len(cls.BIRTHDAY_MESSAGES) - 1)
+        template_index = random.randint(0, len(cls._COMPILED_BIRTHDAY) - 1)
         return cls.get_birthday_message(name, wisher, template_index)
+
+DEFAULT_TEMPLATE_SET = 'business'
+
+TEMPLATE_SETS = {
+    'business': TemplateSet('business', [MessageTemplates.BUSINESS_MESSAGE]),
+    'classic': TemplateSet('classic', MessageTemplates.BIRTHDAY_MESSAGES),
+}
+
+def get_template_set(name=None):
+    """Template set by name; unset or unknown names get the default set"""
+    return TEMPLATE_SETS.get(name) or TEMPLATE_SETS[DEFAULT_TEMPLATE_SET]
+
+def _field_values(name, wisher):
+    return {'name': name, 'first_name': name.split()[0] if name and name.strip() else name, 'wisher': wisher}
+
+def render_birthday_message(name, wisher, contact_id=None, day=None, template_set=None):
+    """Render one contact's birthday message"""
+    template = get_template_set(template_set).select(contact_id, day)
+    return template.render(_field_values(name, wisher) if template.fields else None)
+
+def render_birthday_batch(contacts, wisher, day, template_set=None):
+    """Render birthday messages for contacts (objects with id and name) in one pass
+
+    Returns bodies in contact order. Identical bodies are the same string
+    object, so a day's batch holds one copy per distinct message.
+    """
+    templates = get_template_set(template_set)
+    bodies = []
+    rendered = {}
+    for contact in contacts:
+        template = templates.select(contact.id, day)
+        if not template.fields:
+            bodies.append(template.render(None))
+            continue
+        key = (template, contact.name)
+        body = rendered.get(key)
+        if body is None:
+            body = rendered[key] = template.render(_field_values(contact.name, wisher))
+        bodies.append(body)
+    return bodies
@@ -0,0 +1,141 @@
+"""
+In-process metrics registry rendered in the Prometheus text format
+
+Counters and histograms are plain dicts keyed by label values and guarded
+by one lock per metric, so recording is a dict lookup and a bisect. Each
+process keeps its own registry; under several gunicorn workers every
+worker reports its own numbers, as with the rest of the in-memory state.
+"""
+
+import threading
+from bisect import bisect_left
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Scheduler jobs run for seconds to hours and fire up to the misfire grace period late
+JOB_BUCKETS = (0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def get(self, *labelvalues):
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        for labelvalues, value in values:
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}')
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labelvalues -> [per-bucket counts (last is +Inf), sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labelvalues)
+            if state is None:
+                state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        with self._lock:
+            values = sorted((labelvalues, (list(state[0]), state[1], state[2]))
+                            for labelvalues, state in self._values.items())
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        bounds = self.buckets + (float('inf'),)
+        for labelvalues, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, labelvalues, f'le="{_format_value(float(bound))}"')
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'http_request_duration_seconds', 'API request latency by route', ('method', 'route', 'status')
+)
+TWILIO_SEND_SECONDS = REGISTRY.histogram(
+    'twilio_send_duration_seconds', 'Latency of Twilio message create calls', ('outcome',)
+)
+SEND_OUTCOMES = REGISTRY.counter(
+    'whatsapp_send_outcomes_total', 'Birthday message sends by outcome (sent or error class)', ('outcome',)
+)
+SCHEDULER_JOB_SECONDS = REGISTRY.histogram(
+    'scheduler_job_duration_seconds', 'Scheduler job run time', ('job',), JOB_BUCKETS
+)
+SCHEDULER_JOB_LAG_SECONDS = REGISTRY.histogram(
+    'scheduler_job_lag_seconds', 'Delay between a job\'s scheduled and actual start', ('job',), JOB_BUCKETS
+)
+SCHEDULER_JOB_RUNS = REGISTRY.counter(
+    'scheduler_job_runs_total', 'Scheduler job runs by result (executed, error, missed)', ('job', 'result')
+)
+BIRTHDAY_LOOKUP_SECONDS = REGISTRY.histogram(
+    'birthday_lookup_duration_seconds', 'Birthday lookup time: index lookup plus contact load (today, upcoming), or an index build (index_rebuild)', ('lookup',)
+)
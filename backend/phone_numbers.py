@@ -0,0 +1,44 @@
+"""
+Phone number validation and normalization
+
+Numbers are normalized once, when a contact is written, and stored as
+Contact.whatsapp_e164; the send path reads that column as-is. The rule is
+the one sends have always used: drop a "whatsapp:" prefix and every
+non-digit, then prefix "+". No country code is guessed.
+"""
+
+import re
+
+WHATSAPP_PREFIX = 'whatsapp:'
+
+# Optional +, a non-zero first digit, then 8-16 digits and separators
+_VALID_NUMBER = re.compile(r'^[\+]?[1-9][\d\s\-$$$$]{7,15}$')
+_NON_DIGITS = re.compile(r'\D')
+
+def strip_whatsapp_prefix(phone_number):
+    if phone_number.startswith(WHATSAPP_PREFIX):
+        return phone_number[len(WHATSAPP_PREFIX):]
+    return phone_number
+
+def validate_phone_number(phone_number):
+    """Check a user-entered number; returns (True, cleaned number) or (False, error)"""
+    if not phone_number:
+        return False, "Phone number is required"
+
+    clean_number = phone_number.replace(WHATSAPP_PREFIX, "").strip()
+    if not _VALID_NUMBER.match(clean_number):
+        return False, "Invalid phone number format"
+
+    return True, clean_number
+
+def normalize_e164(phone_number):
+    """Canonical +<digits> form of a number ('' if it has no digits)"""
+    if not phone_number:
+        return ''
+    digits = _NON_DIGITS.sub('', strip_whatsapp_prefix(phone_number))
+    return '+' + digits if digits else ''
+
+def to_whatsapp_address(phone_number):
+    """Twilio WhatsApp channel address (whatsapp:+<digits>) for a number"""
+    normalized = normalize_e164(phone_number)
+    return WHATSAPP_PREFIX + normalized if normalized else ''
@@ -0,0 +1,306 @@
+"""
+Opt-in profiling for API requests and scheduler runs
+
+Two independent switches, both free when off:
+
+- SERVER_TIMING=1 adds a Server-Timing header to every API response,
+  splitting the request into db (SQL execution), render (message
+  formatting and JSON serialization), send (Twilio calls) and total.
+  Phases are accumulated in a thread-local, so sends made on dispatch
+  worker threads are not counted; background send jobs report through
+  /metrics instead.
+- With PROFILING_ADMIN_TOKEN set, POST /api/admin/profiling arms a capture
+  of the next N requests or the next scheduled birthday check, either with
+  cProfile (.prof, for pstats/snakeviz) or with a sampling profiler
+  (.folded stacks, for flamegraph.pl/speedscope). Files go to PROFILE_DIR.
+
+Armed captures are per process, like the metrics registry: under several
+gunicorn workers only the worker that answered the toggle profiles its
+requests, and only the scheduler leader runs the birthday check.
+"""
+
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING', '').lower() in ('1', 'true', 'yes')
+
+# Admin token for the profiling toggle; the endpoints are disabled without it
+PROFILING_ADMIN_TOKEN = os.environ.get('PROFILING_ADMIN_TOKEN', '')
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'profiles'))
+
+# Seconds between stack samples for the sampling profiler
+SAMPLE_INTERVAL = float(os.environ.get('PROFILE_SAMPLE_INTERVAL', 0.005))
+
+PROFILE_TARGETS = ('requests', 'scheduler')
+PROFILE_MODES = ('cprofile', 'sample')
+
+# Largest number of requests one toggle may capture
+MAX_PROFILED_REQUESTS = 1000
+
+SERVER_TIMING_PHASES = ('db', 'render', 'send')
+
+_local = threading.local()
+
+# Server-Timing phases
+
+def start_timings():
+    """Begin collecting phase timings for the current thread"""
+    _local.timings = {}
+
+def finish_timings():
+    """Stop collecting and return this thread's phase timings (None if not collecting)"""
+    timings = getattr(_local, 'timings', None)
+    _local.timings = None
+    return timings
+
+def record_phase(name, seconds):
+    """Add seconds to a phase of the current request, if timings are being collected"""
+    timings = getattr(_local, 'timings', None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+class _Phase:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        record_phase(self.name, time.perf_counter() - self.started)
+        return False
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+_NO_PHASE = _NoPhase()
+
+def phase(name):
+    """Context manager timing a block into a Server-Timing phase"""
+    if getattr(_local, 'timings', None) is None:
+        return _NO_PHASE
+    return _Phase(name)
+
+def format_server_timing(timings, total):
+    """Server-Timing header value, durations in milliseconds"""
+    entries = [f"{name};dur={timings.get(name, 0.0) * 1000:.2f}" for name in SERVER_TIMING_PHASES]
+    entries.extend(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()
+                   if name not in SERVER_TIMING_PHASES)
+    entries.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(entries)
+
+def install_db_timing(engine_class):
+    """Time SQL execution into the db phase (registered only when Server-Timing is on)"""
+    from sqlalchemy import event
+
+    @event.listens_for(engine_class, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('profiling_query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine_class, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['profiling_query_started'].pop()
+        record_phase('db', time.perf_counter() - started)
+
+def create_timed_json_provider(base_class):
+    """JSON provider whose response() serialization counts as the render phase"""
+    class TimedJSONProvider(base_class):
+        def response(self, *args, **kwargs):
+            with phase('render'):
+                return super().response(*args, **kwargs)
+
+    return TimedJSONProvider
+
+# Profile captures
+
+class SamplingProfiler:
+    """Statistical profiler sampling thread stacks from a background thread
+
+    Stacks are aggregated into folded form ("outer;inner;leaf count"), which
+    flame graph tools read directly. thread_ids limits sampling to those
+    threads; None samples every thread except the sampler itself.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_ids=None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._sample, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+class ProfileSession:
+    """One capture: a profiler started and stopped around a unit of work"""
+
+    def __init__(self, target, mode, label):
+        self.target = target
+        self.mode = mode
+        self.label = label
+        self.path = None
+        if mode == 'cprofile':
+            import cProfile
+            self._profiler = cProfile.Profile()
+        else:
+            # Requests are profiled on their own thread; scheduler runs fan out to dispatch threads
+            thread_ids = {threading.get_ident()} if target == 'requests' else None
+            self._profiler = SamplingProfiler(thread_ids=thread_ids)
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profiler.enable()
+        else:
+            self._profiler.start()
+
+    def stop(self):
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        elapsed = time.perf_counter() - self.started
+
+        stamp = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        extension = 'prof' if self.mode == 'cprofile' else 'folded'
+        self.path = os.path.join(PROFILE_DIR, f"{self.target}-{stamp}-{self.label}.{extension}")
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self.mode == 'cprofile':
+                self._profiler.dump_stats(self.path)
+            else:
+                self._profiler.dump(self.path)
+        except OSError as e:
+            logger.error(f"Could not write profile {self.path}: {str(e)}")
+            return None
+        _captures.finished(self.target, self.path)
+        logger.info(f"Profile of {self.target} {self.label} ({elapsed * 1000:.1f} ms) written to {self.path}")
+        return self.path
+
+class ProfileCaptures:
+    """Armed captures per target; take() hands out one session per unit of work"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._armed = {target: None for target in PROFILE_TARGETS}
+        self._recent = []
+
+    def arm(self, target, mode, count=1):
+        with self._lock:
+            self._armed[target] = {'mode': mode, 'remaining': count, 'armed_at': datetime.utcnow().isoformat()}
+
+    def disarm(self, target=None):
+        with self._lock:
+            for name in ([target] if target else PROFILE_TARGETS):
+                self._armed[name] = None
+
+    def take(self, target, label):
+        """Start a session if a capture is armed for target, else None"""
+        # Unlocked read first: the common case is "nothing armed", which must stay cheap
+        if self._armed[target] is None:
+            return None
+        with self._lock:
+            armed = self._armed[target]
+            if armed is None:
+                return None
+            armed['remaining'] -= 1
+            if armed['remaining'] <= 0:
+                self._armed[target] = None
+            mode = armed['mode']
+        session = ProfileSession(target, mode, label)
+        session.start()
+        return session
+
+    def finished(self, target, path):
+        with self._lock:
+            self._recent = ([{'target': target, 'path': path}] + self._recent)[:20]
+
+    def get_status(self):
+        with self._lock:
+            return {
+                'armed': {target: dict(armed) if armed else None for target, armed in self._armed.items()},
+                'recent_profiles': list(self._recent),
+                'profile_dir': PROFILE_DIR
+            }
+
+_captures = ProfileCaptures()
+
+def arm_capture(target, mode, count=1):
+    _captures.arm(target, mode, count)
+    logger.info(f"Armed {mode} capture of {target} (next {count})")
+
+def disarm_capture(target=None):
+    _captures.disarm(target)
+
+def get_profiling_status():
+    status = _captures.get_status()
+    status['server_timing'] = SERVER_TIMING_ENABLED
+    return status
+
+def start_request_profile(label):
+    """Profile session for the current request if one is armed, else None"""
+    return _captures.take('requests', label)
+
+class profile_scheduler_run:
+    """Context manager profiling a scheduler run when one is armed"""
+
+    def __init__(self, label):
+        self.label = label
+        self.session = None
+
+    def __enter__(self):
+        self.session = _captures.take('scheduler', self.label)
+        return self.session
+
+    def __exit__(self, *exc_info):
+        if self.session is not None:
+            self.session.stop()
+        return False
+
+def check_admin_token(token):
+    """True if token matches PROFILING_ADMIN_TOKEN (always False when unset)"""
+    # Compare bytes: compare_digest rejects str with non-ASCII characters
+    return bool(PROFILING_ADMIN_TOKEN) and hmac.compare_digest(
+        (token or '').encode('utf-8'), PROFILING_ADMIN_TOKEN.encode('utf-8')
+    )
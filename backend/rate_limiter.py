@@ -0,0 +1,151 @@
+"""
+Adaptive token-bucket rate limiting for outgoing WhatsApp messages
+
+One bucket is shared by every caller sending from the same Twilio number.
+The rate is halved whenever Twilio answers 429 (honouring Retry-After) and
+ramps back towards the configured ceiling while sends keep succeeding.
+"""
+
+import os
+import threading
+import time
+
+# Messages per second per sender number, and how many may go out in a burst
+DEFAULT_SEND_RATE = float(os.environ.get('TWILIO_SEND_RATE', 10))
+DEFAULT_SEND_BURST = int(os.environ.get('TWILIO_SEND_BURST', 10))
+
+class AdaptiveTokenBucket:
+    def __init__(self, rate=DEFAULT_SEND_RATE, burst=DEFAULT_SEND_BURST, min_rate=0.2,
+                 backoff_factor=0.5, backoff_window=1.0, recovery_delay=5.0,
+                 clock=time.monotonic, sleep=time.sleep):
+        """clock and sleep can be replaced, e.g. by a fake clock in tests"""
+        self.max_rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.rate = self.max_rate
+        self.capacity = max(1, burst)
+        self.backoff_factor = backoff_factor
+        # Throttles arriving together from concurrent senders only back off once
+        self.backoff_window = backoff_window
+        self.recovery_delay = recovery_delay
+        # Each success after the recovery delay adds 2% of the ceiling back
+        self.increase_step = self.max_rate / 50
+
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._last_throttled = 0.0
+        self._last_backoff = 0.0
+
+        self.acquired_count = 0
+        self.throttled_count = 0
+        self.waiting = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Block until the caller may send; returns the seconds spent waiting
+
+        Tokens are reserved up front (the balance may go negative), so
+        concurrent callers are released in arrival order at the current rate.
+        """
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            self._tokens -= 1
+            ready_at = max(now, self._blocked_until)
+            if self._tokens < 0:
+                ready_at = max(ready_at, now + -self._tokens / self.rate)
+            wait = ready_at - now
+            self.waiting += 1
+
+        if wait > 0:
+            self._sleep(wait)
+
+        with self._lock:
+            self.waiting -= 1
+            self.acquired_count += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        return wait
+
+    def on_success(self):
+        """Ramp the rate back up once Twilio has stopped throttling"""
+        with self._lock:
+            if self.rate < self.max_rate and self._clock() - self._last_throttled >= self.recovery_delay:
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_throttled(self, retry_after=None):
+        """Back off after a 429; retry_after (seconds) pauses the bucket entirely"""
+        with self._lock:
+            now = self._clock()
+            self._refill(now)
+            if now - self._last_backoff >= self.backoff_window:
+                self.rate = max(self.min_rate, self.rate * self.backoff_factor)
+                self._last_backoff = now
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._last_throttled = now
+            self.throttled_count += 1
+
+    def get_stats(self):
+        """Get the effective rate and queue wait statistics"""
+        with self._lock:
+            return {
+                'effective_rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'burst': self.capacity,
+                'sent': self.acquired_count,
+                'throttled': self.throttled_count,
+                'waiting': self.waiting,
+                'avg_wait_seconds': round(self.total_wait / self.acquired_count, 4) if self.acquired_count else 0.0,
+                'max_wait_seconds': round(self.max_wait, 4),
+                'blocked_for_seconds': round(max(0.0, self._blocked_until - self._clock()), 3)
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# Fraction of the configured rate this process may use
+_rate_share = 1.0
+
+def set_rate_share(share):
+    """Give this process a fraction of each sender's rate, e.g. 1/N for one of N dispatch processes"""
+    global _rate_share
+    with _limiters_lock:
+        _rate_share = share
+
+def get_rate_limiter(sender):
+    """Get the shared rate limiter for a sender number"""
+    with _limiters_lock:
+        limiter = _limiters.get(sender)
+        if limiter is None:
+            limiter = _limiters[sender] = AdaptiveTokenBucket(
+                rate=DEFAULT_SEND_RATE * _rate_share,
+                burst=max(1, int(DEFAULT_SEND_BURST * _rate_share))
+            )
+        return limiter
+
+def reset_rate_limiters():
+    """Forget every sender's bucket, e.g. between benchmark runs"""
+    with _limiters_lock:
+        _limiters.clear()
+
+def get_rate_limiter_stats():
+    """Get statistics for every sender number seen by this process"""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {sender: limiter.get_stats() for sender, limiter in limiters.items()}
+
+def parse_retry_after(value):
+    """Parse a Retry-After header given in seconds; HTTP dates are ignored"""
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,125 @@
+"""
+Retry queue and dead letters for failed birthday sends
+
+Ledger rows in the 'retry' status are drained by a scheduler job once their
+next_attempt_at has passed; only those contacts are re-sent. Rows in the
+'dead' status form the dead-letter store and can be requeued by hand.
+"""
+
+import logging
+import time
+from datetime import datetime, timedelta
+
+from app import app, db, MessageDelivery, iter_contacts_by_ids, get_settings_snapshot
+from delivery_ledger import (
+    Claim, STATUS_PENDING, STATUS_RETRY, STATUS_DEAD, RETRY_BASE_SECONDS, record_deliveries
+)
+from dispatch import dispatch_birthday_messages
+from message_templates import render_birthday_message
+from sender_pool import plan_batch
+from utils import get_local_today
+from whatsapp_service import create_whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+def claim_due_retries(limit=500):
+    """Claim retry rows whose backoff has elapsed; returns {contact_id: Claim}
+
+    At most one row per contact is claimed in a pass. A contact's other due
+    rows (another delivery date or kind) stay queued for the next pass.
+    """
+    now = datetime.utcnow()
+    due = db.session.query(
+        MessageDelivery.id, MessageDelivery.contact_id, MessageDelivery.attempts
+    ).filter(
+        MessageDelivery.next_attempt_at <= now,
+        MessageDelivery.status == STATUS_RETRY
+    ).order_by(MessageDelivery.next_attempt_at).limit(limit).all()
+
+    claimed = {}
+    for row in due:
+        if row.contact_id in claimed:
+            continue
+        updated = MessageDelivery.query.filter(
+            MessageDelivery.id == row.id,
+            MessageDelivery.status == STATUS_RETRY
+        ).update({
+            MessageDelivery.status: STATUS_PENDING,
+            MessageDelivery.attempts: MessageDelivery.attempts + 1,
+            MessageDelivery.next_attempt_at: None,
+            MessageDelivery.updated_at: now
+        }, synchronize_session=False)
+        if updated:
+            claimed[row.contact_id] = Claim(row.id, row.attempts + 1)
+    db.session.commit()
+    return claimed
+
+def drain_retry_queue(max_workers=None):
+    """Re-send every retry whose backoff has elapsed"""
+    with app.app_context():
+        claimed = claim_due_retries()
+        if not claimed:
+            return 0
+
+        settings = get_settings_snapshot()
+        whatsapp_service = create_whatsapp_service(settings.to_dict()) if settings else None
+        if not settings or not settings.wisher_name or not whatsapp_service.is_configured():
+            # Put the rows back for a later attempt rather than burning retries
+            MessageDelivery.query.filter(
+                MessageDelivery.id.in_([claim.id for claim in claimed.values()])
+            ).update({
+                MessageDelivery.status: STATUS_RETRY,
+                MessageDelivery.attempts: MessageDelivery.attempts - 1,
+                MessageDelivery.next_attempt_at: datetime.utcnow() + timedelta(seconds=RETRY_BASE_SECONDS)
+            }, synchronize_session=False)
+            db.session.commit()
+            logger.warning("Settings not configured - retries postponed")
+            return 0
+
+        contacts = list(iter_contacts_by_ids(sorted(claimed)))
+        found = {contact.id for contact in contacts}
+        missing = [(contact_id, False, 'Contact deleted', 'contact_deleted') for contact_id in claimed if contact_id not in found]
+
+        # Render each retry for its original delivery date, so it repeats the first attempt's message
+        delivery_dates = dict(db.session.query(MessageDelivery.id, MessageDelivery.delivery_date).filter(
+            MessageDelivery.id.in_([claim.id for claim in claimed.values()])
+        ))
+        recipients = []
+        for contact in contacts:
+            body = render_birthday_message(contact.name, settings.wisher_name, contact.id,
+                                           delivery_dates.get(claimed[contact.id].id), settings.message_template_set)
+            recipients.append((contact.name, contact.send_number, body))
+        today = get_local_today()
+        pool, assignments, services = plan_batch(whatsapp_service, contacts, today)
+        started = time.perf_counter()
+        results = dispatch_birthday_messages(
+            whatsapp_service,
+            recipients,
+            settings.wisher_name,
+            max_workers=max_workers,
+            services=services
+        )
+        if pool:
+            pool.record_results(assignments, results, today, time.perf_counter() - started)
+        record_deliveries(claimed, missing + [
+            (contact.id, result['success'], result['message'], result['error_class'])
+            for contact, result in zip(contacts, results)
+        ])
+
+        sent_count = sum(1 for result in results if result['success'])
+        logger.info(f"Retry queue drained - Sent: {sent_count}, Failed: {len(claimed) - sent_count}")
+        return len(claimed)
+
+def requeue_dead_letter(delivery_id):
+    """Move a dead letter back into the retry queue for an immediate attempt"""
+    updated = MessageDelivery.query.filter(
+        MessageDelivery.id == delivery_id,
+        MessageDelivery.status == STATUS_DEAD
+    ).update({
+        MessageDelivery.status: STATUS_RETRY,
+        MessageDelivery.attempts: 0,
+        MessageDelivery.next_attempt_at: datetime.utcnow(),
+        MessageDelivery.updated_at: datetime.utcnow()
+    }, synchronize_session=False)
+    db.session.commit()
+    return bool(updated)
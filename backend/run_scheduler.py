@@ -13,18 +13,13 @@ from datetime import datetime
 # Add the backend directory to the Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from scheduler_service import BirthdayScheduler
-from app import app
+from logging_config import configure_logging
+
+# Configure logging before the app does, so the scheduler also writes its rotating log file
+configure_logging(log_file=os.environ.get('LOG_FILE') or 'birthday_scheduler.log')
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('birthday_scheduler.log'),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+from scheduler_service import get_scheduler
+from app import app
 
 logger = logging.getLogger(__name__)
 
@@ -33,14 +28,19 @@ class SchedulerService:
         self.scheduler = None
         self.running = False
     
-    def start(self, check_hour=9, check_minute=0):
+    def start(self, check_hour=9, check_minute=0, workers=None, local_time=False):
         """Start the scheduler service"""
         logger.info("Starting Birthday Scheduler Service...")
         
         try:
             with app.app_context():
-                self.scheduler = BirthdayScheduler()
-                success, message = self.scheduler.start_daily_check(check_hour, check_minute)
+                self.scheduler = get_scheduler()
+                # workers is stored with the job, so it applies whichever process holds the scheduler lease
+                if local_time:
+                    # Send at check_hour:check_minute in each contact's own timezone
+                    success, message = self.scheduler.start_local_delivery(check_hour, check_minute, workers)
+                else:
+                    success, message = self.scheduler.start_daily_check(check_hour, check_minute, workers)
                 
                 if success:
                     self.running = True
@@ -60,8 +60,9 @@ class SchedulerService:
         """Stop the scheduler service"""
         logger.info("Stopping Birthday Scheduler Service...")
         
+        # Leave the shared jobs in place; another process takes over the lease
         if self.scheduler:
-            self.scheduler.stop_daily_check()
+            self.scheduler.shutdown()
         
         self.running = False
         logger.info("Scheduler service stopped")
@@ -88,19 +89,35 @@ if __name__ == "__main__":
     signal.signal(signal.SIGINT, signal_handler)
     signal.signal(signal.SIGTERM, signal_handler)
     
-    # Parse command line arguments
+    # Parse command line arguments: [hour] [minute] [--workers N] [--local]
+    args = sys.argv[1:]
     check_hour = 9  # Default to 9 AM
     check_minute = 0  # Default to 0 minutes
+    workers = None  # Default to DISPATCH_PROCESSES
+    local_time = '--local' in args
+    if local_time:
+        args.remove('--local')
+    
+    if '--workers' in args:
+        index = args.index('--workers')
+        try:
+            workers = int(args[index + 1])
+            if workers < 1:
+                raise ValueError
+        except (IndexError, ValueError):
+            logger.error("Invalid --workers argument. Using default")
+            workers = None
+        del args[index:index + 2]
     
-    if len(sys.argv) > 1:
+    if len(args) > 0:
         try:
-            check_hour = int(sys.argv[1])
+            check_hour = int(args[0])
         except ValueError:
             logger.error("Invalid hour argument. Using default (9)")
     
-    if len(sys.argv) > 2:
+    if len(args) > 1:
         try:
-            check_minute = int(sys.argv[2])
+            check_minute = int(args[1])
         except ValueError:
             logger.error("Invalid minute argument. Using default (0)")
     
@@ -111,4 +128,4 @@ if __name__ == "__main__":
     
     # Start the service
     service = SchedulerService()
-    service.start(check_hour, check_minute)
+    service.start(check_hour, check_minute, workers, local_time)
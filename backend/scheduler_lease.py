@@ -0,0 +1,147 @@
+"""
+Database-backed leader lease for the birthday scheduler
+
+Every process that creates a BirthdayScheduler shares one job store, but
+only the process holding the lease runs jobs. The holder renews the lease
+every LEASE_SECONDS / 3; if it dies, another process takes the lease over
+once it expires. Acquisition is a conditional UPDATE (or an INSERT guarded
+by the primary key), so two processes can never both hold it.
+
+A process can also join the lease through a LeaseWatcher, which polls it
+without a scheduler and builds one only once this process wins the lease.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app import app, db, SchedulerLease
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = float(os.environ.get('SCHEDULER_LEASE_SECONDS', 15))
+SCHEDULER_LEASE_NAME = 'birthday_scheduler'
+
+class LeaderLease:
+    def __init__(self, name, ttl=LEASE_SECONDS):
+        self.name = name
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        with app.app_context():
+            SchedulerLease.__table__.create(db.engine, checkfirst=True)
+
+    @property
+    def renew_interval(self):
+        return self.ttl / 3
+
+    def acquire(self):
+        """Take or renew the lease; returns True while this process holds it"""
+        try:
+            with app.app_context():
+                now = datetime.utcnow()
+                values = {
+                    SchedulerLease.holder: self.holder,
+                    SchedulerLease.expires_at: now + timedelta(seconds=self.ttl),
+                    SchedulerLease.renewed_at: now
+                }
+                updated = SchedulerLease.query.filter(
+                    SchedulerLease.name == self.name,
+                    or_(SchedulerLease.holder == self.holder, SchedulerLease.expires_at < now)
+                ).update(values, synchronize_session=False)
+                if not updated and db.session.get(SchedulerLease, self.name) is None:
+                    try:
+                        with db.session.begin_nested():
+                            db.session.add(SchedulerLease(
+                                name=self.name, holder=self.holder,
+                                expires_at=now + timedelta(seconds=self.ttl), renewed_at=now
+                            ))
+                        updated = 1
+                    except IntegrityError:
+                        # Another process created the lease first
+                        pass
+                db.session.commit()
+                return bool(updated)
+        except Exception as e:
+            # Without a confirmed renewal, assume another process may take over
+            logger.error(f"Failed to renew scheduler lease: {str(e)}")
+            return False
+
+    def release(self):
+        """Give up the lease so another process can take over immediately"""
+        try:
+            with app.app_context():
+                SchedulerLease.query.filter_by(name=self.name, holder=self.holder).update(
+                    {SchedulerLease.expires_at: datetime.utcnow() - timedelta(seconds=1)},
+                    synchronize_session=False
+                )
+                db.session.commit()
+        except Exception as e:
+            logger.error(f"Failed to release scheduler lease: {str(e)}")
+
+    def get_status(self):
+        """Describe the current lease holder"""
+        with app.app_context():
+            lease = db.session.get(SchedulerLease, self.name)
+            return {
+                'holder': lease.holder if lease else None,
+                'expires_at': lease.expires_at.isoformat() if lease else None,
+                'this_process': self.holder
+            }
+
+class LeaseWatcher:
+    """Polls a lease in a background thread and calls on_acquired() once this process takes it"""
+
+    def __init__(self, name, on_acquired, ttl=LEASE_SECONDS):
+        self.lease = LeaderLease(name, ttl)
+        self._on_acquired = on_acquired
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='scheduler-lease-watch', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            if self.lease.acquire():
+                # A scheduler created meanwhile has already taken the lease over
+                if not self._stopped.is_set():
+                    try:
+                        self._on_acquired()
+                    except Exception as e:
+                        logger.error(f"Failed to start after acquiring the {self.lease.name} lease: {str(e)}")
+                return
+            self._stopped.wait(self.lease.renew_interval)
+
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+def watch_lease(name, on_acquired, ttl=LEASE_SECONDS):
+    """Start watching a lease in this process, unless it is already watched"""
+    with _watchers_lock:
+        watcher = _watchers.get(name)
+        if watcher is None:
+            watcher = _watchers[name] = LeaseWatcher(name, on_acquired, ttl).start()
+        return watcher
+
+def take_watched_lease(name):
+    """Stop watching a lease and return the watcher's LeaderLease, or None if it is not watched
+
+    The returned lease keeps the watcher's holder id, so a lease the watcher
+    already won stays with this process.
+    """
+    with _watchers_lock:
+        watcher = _watchers.pop(name, None)
+    if watcher is None:
+        return None
+    watcher.stop()
+    return watcher.lease
@@ -1,51 +1,193 @@
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.events import EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.triggers.date import DateTrigger
-from datetime import datetime, date
+from datetime import datetime
 import logging
 import atexit
-from app import app, db, Contact, Settings
+from app import (
+    app, db, Contact, get_birthday_contacts, get_settings_snapshot, list_upcoming_birthdays,
+    iter_contacts_by_ids, get_data_version
+)
 from whatsapp_service import create_whatsapp_service
+from dispatch import DEFAULT_MAX_WORKERS
+from utils import get_local_today, SCHEDULER_TIMEZONE
+from delivery_ledger import send_birthday_batch
+from sharded_dispatch import DEFAULT_PROCESSES, send_birthday_shards
+from send_jobs import start_send_job
+from retry_queue import drain_retry_queue
+from sender_pool import get_sender_pool_status
+from local_delivery import LocalTimeDelivery, DELIVERY_TICK_SECONDS
+from scheduler_lease import LeaderLease, SCHEDULER_LEASE_NAME, take_watched_lease
+from metrics import SCHEDULER_JOB_SECONDS, SCHEDULER_JOB_LAG_SECONDS, SCHEDULER_JOB_RUNS
+from profiling import profile_scheduler_run
+from logging_config import SAMPLED
 import threading
+import time
+import os
 import pytz
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How often (seconds) the retry queue is checked for due sends
+RETRY_POLL_SECONDS = int(os.environ.get('RETRY_POLL_SECONDS', 60))
+
+# How late (seconds) a job may still run, e.g. after a new leader takes over
+MISFIRE_GRACE_SECONDS = int(os.environ.get('SCHEDULER_MISFIRE_GRACE_SECONDS', 3600))
+
+JOBSTORE_TABLE = 'apscheduler_jobs'
+LOCAL_DELIVERY_JOB_ID = 'local_time_delivery'
+
+# Jobs live in the shared database, so they must reference module-level functions
+def run_birthday_check(processes=None):
+    with profile_scheduler_run('birthday_check'):
+        get_scheduler().check_and_send_birthday_messages(processes)
+
+def run_retry_drain():
+    get_scheduler().drain_retry_queue()
+
+def run_interval_end():
+    get_scheduler().stop_interval_check()
+
+def run_local_delivery_tick(hour, minute, processes=None):
+    get_scheduler().run_local_delivery_tick(hour, minute, processes)
+
+def _load_local_delivery_rows(day):
+    return Contact.birthdays_on(day).with_entities(Contact.id, Contact.timezone).all()
+
 class BirthdayScheduler:
     def __init__(self):
-        # Use India Standard Time for all scheduled jobs
-        ist = pytz.timezone('Asia/Kolkata')
-        self.scheduler = BackgroundScheduler(timezone=ist)
-        self.scheduler.start()
-        self.is_running = False
-        self.is_interval_running = False
+        # Use the scheduler timezone (India Standard Time by default) for all scheduled jobs
+        ist = pytz.timezone(SCHEDULER_TIMEZONE)
+        with app.app_context():
+            engine = db.engine
+        
+        # Jobs are shared by every process; only the lease holder runs them
+        self.scheduler = BackgroundScheduler(
+            jobstores={'default': SQLAlchemyJobStore(engine=engine, tablename=JOBSTORE_TABLE)},
+            job_defaults={'coalesce': True, 'max_instances': 1, 'misfire_grace_time': MISFIRE_GRACE_SECONDS},
+            timezone=ist
+        )
+        # Job lag, duration and results for /metrics
+        self._job_starts = {}
+        self._job_starts_lock = threading.Lock()
+        self.scheduler.add_listener(
+            self._record_job_event, EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED
+        )
+        # Carry over the lease a watcher in this process may already hold
+        self.lease = take_watched_lease(SCHEDULER_LEASE_NAME) or LeaderLease(SCHEDULER_LEASE_NAME)
+        self.is_leader = self.lease.acquire()
+        self.scheduler.start(paused=not self.is_leader)
         self.interval_end_job_id = 'interval_end_timer'
+        self.dispatch_workers = DEFAULT_MAX_WORKERS
+        # Worker processes for scheduled runs, unless the job carries its own (run_scheduler.py --workers)
+        self.dispatch_processes = DEFAULT_PROCESSES
+        # Plan of upcoming sends at each contact's local time, fed by the local delivery tick job
+        self.local_delivery = LocalTimeDelivery(
+            _load_local_delivery_rows,
+            lambda: get_data_version('contacts'),
+            SCHEDULER_TIMEZONE,
+            catch_up_seconds=MISFIRE_GRACE_SECONDS
+        )
+        
+        # Drain failed sends whose backoff has elapsed
+        self.scheduler.add_job(
+            func=run_retry_drain,
+            trigger=IntervalTrigger(seconds=RETRY_POLL_SECONDS),
+            id='retry_queue_drain',
+            name='Retry Queue Drain',
+            replace_existing=True
+        )
+        
+        self._stopped = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='scheduler-lease', daemon=True)
+        self._heartbeat.start()
         
         # Register shutdown handler
-        atexit.register(lambda: self.scheduler.shutdown())
+        atexit.register(self.shutdown)
         
-        logger.info("Birthday Scheduler initialized")
+        logger.info(f"Birthday Scheduler initialized ({'leader' if self.is_leader else 'standby'})")
+    
+    @property
+    def is_running(self):
+        return self.scheduler.get_job('daily_birthday_check') is not None
+    
+    @property
+    def is_interval_running(self):
+        return self.scheduler.get_job('interval_birthday_check') is not None
+    
+    @property
+    def is_local_delivery_running(self):
+        return self.scheduler.get_job(LOCAL_DELIVERY_JOB_ID) is not None
+    
+    def _heartbeat_loop(self):
+        while not self._stopped.wait(self.lease.renew_interval):
+            self.renew_lease()
     
-    def start_daily_check(self, hour=0, minute=0):
-        """Start the daily birthday check at specified time"""
+    def renew_lease(self):
+        """Renew or take over the leader lease and pause/resume job processing to match"""
+        was_leader = self.is_leader
+        self.is_leader = self.lease.acquire()
+        if self.is_leader and not was_leader:
+            logger.info("Acquired scheduler lease - running jobs in this process")
+            self.scheduler.resume()
+        elif was_leader and not self.is_leader:
+            logger.warning("Lost scheduler lease - pausing jobs in this process")
+            self.scheduler.pause()
+        elif self.is_leader:
+            # Pick up jobs other processes added to the shared store
+            self.scheduler.wakeup()
+    
+    def _record_job_event(self, event):
+        if event.code == EVENT_JOB_SUBMITTED:
+            now = datetime.now(self.scheduler.timezone)
+            with self._job_starts_lock:
+                for run_time in event.scheduled_run_times:
+                    SCHEDULER_JOB_LAG_SECONDS.observe(max(0.0, (now - run_time).total_seconds()), event.job_id)
+                    self._job_starts[(event.job_id, run_time)] = time.perf_counter()
+        elif event.code == EVENT_JOB_MISSED:
+            SCHEDULER_JOB_RUNS.inc(event.job_id, 'missed')
+        else:
+            with self._job_starts_lock:
+                started = self._job_starts.pop((event.job_id, event.scheduled_run_time), None)
+            if started is not None:
+                SCHEDULER_JOB_SECONDS.observe(time.perf_counter() - started, event.job_id)
+            SCHEDULER_JOB_RUNS.inc(event.job_id, 'error' if event.code == EVENT_JOB_ERROR else 'executed')
+    
+    def shutdown(self):
+        """Stop this process's scheduler and hand the lease to another process"""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        self.scheduler.shutdown(wait=False)
+        if self.is_leader:
+            self.lease.release()
+            self.is_leader = False
+    
+    def start_daily_check(self, hour=0, minute=0, processes=None):
+        """Start the daily birthday check at specified time
+
+        processes is stored with the job, so whichever process holds the
+        lease sends from that many worker processes.
+        """
         try:
             # Remove existing job if it exists
             if self.scheduler.get_job('daily_birthday_check'):
                 self.scheduler.remove_job('daily_birthday_check')
+            self._stop_local_delivery_for("daily check")
             
             # Add new job
             self.scheduler.add_job(
-                func=self.check_and_send_birthday_messages,
+                func=run_birthday_check,
                 trigger=CronTrigger(hour=hour, minute=minute),
+                kwargs={'processes': processes},
                 id='daily_birthday_check',
                 name='Daily Birthday Check',
                 replace_existing=True
             )
             
-            self.is_running = True
             logger.info(f"Daily birthday check scheduled for {hour:02d}:{minute:02d}")
             return True, f"Scheduler started - daily check at {hour:02d}:{minute:02d}"
             
@@ -53,12 +195,32 @@ class BirthdayScheduler:
             logger.error(f"Failed to start scheduler: {str(e)}")
             return False, f"Failed to start scheduler: {str(e)}"
     
+    def _stop_local_delivery_for(self, check):
+        """Remove the local-time delivery job before starting a daily or interval check
+
+        Local-time delivery keys the ledger by each contact's local date, so
+        it never runs alongside a check keyed by the scheduler's date.
+        """
+        if self.is_local_delivery_running:
+            self.scheduler.remove_job(LOCAL_DELIVERY_JOB_ID)
+            logger.info(f"Local-time delivery stopped in favour of the {check}")
+
+    def _stop_checks_for_local_delivery(self):
+        """Remove the daily and interval checks, and any interval end timer, before starting local-time delivery"""
+        if self.scheduler.get_job('daily_birthday_check'):
+            self.scheduler.remove_job('daily_birthday_check')
+            logger.info("Daily birthday check stopped in favour of local-time delivery")
+        if self.scheduler.get_job('interval_birthday_check'):
+            self.scheduler.remove_job('interval_birthday_check')
+            logger.info("Interval birthday check stopped in favour of local-time delivery")
+        if self.scheduler.get_job(self.interval_end_job_id):
+            self.scheduler.remove_job(self.interval_end_job_id)
+
     def stop_daily_check(self):
         """Stop the daily birthday check"""
         try:
             if self.scheduler.get_job('daily_birthday_check'):
                 self.scheduler.remove_job('daily_birthday_check')
-                self.is_running = False
                 logger.info("Daily birthday check stopped")
                 return True, "Scheduler stopped"
             else:
@@ -67,6 +229,74 @@ class BirthdayScheduler:
             logger.error(f"Failed to stop scheduler: {str(e)}")
             return False, f"Failed to stop scheduler: {str(e)}"
 
+    def start_local_delivery(self, hour=9, minute=0, processes=None):
+        """Send each contact's message at hour:minute in their own timezone, replacing the daily check"""
+        try:
+            if not (0 <= hour <= 23) or not (0 <= minute <= 59):
+                return False, "Invalid time format. Hour must be 0-23, minute must be 0-59"
+            
+            self._stop_checks_for_local_delivery()
+            
+            # One tick job sends whichever delivery slots have come due; the send time travels in its kwargs
+            self.scheduler.add_job(
+                func=run_local_delivery_tick,
+                trigger=IntervalTrigger(seconds=DELIVERY_TICK_SECONDS),
+                kwargs={'hour': hour, 'minute': minute, 'processes': processes},
+                id=LOCAL_DELIVERY_JOB_ID,
+                name=f'Local-Time Delivery ({hour:02d}:{minute:02d})',
+                replace_existing=True
+            )
+            
+            logger.info(f"Local-time delivery scheduled for {hour:02d}:{minute:02d} in each contact's timezone")
+            return True, f"Local-time delivery started - {hour:02d}:{minute:02d} in each contact's timezone"
+        
+        except Exception as e:
+            logger.error(f"Failed to start local-time delivery: {str(e)}")
+            return False, f"Failed to start local-time delivery: {str(e)}"
+    
+    def stop_local_delivery(self):
+        """Stop local-time delivery"""
+        try:
+            if self.is_local_delivery_running:
+                self.scheduler.remove_job(LOCAL_DELIVERY_JOB_ID)
+                logger.info("Local-time delivery stopped")
+                return True, "Local-time delivery stopped"
+            else:
+                return False, "Local-time delivery is not running"
+        except Exception as e:
+            logger.error(f"Failed to stop local-time delivery: {str(e)}")
+            return False, f"Failed to stop local-time delivery: {str(e)}"
+    
+    def run_local_delivery_tick(self, hour, minute, processes=None):
+        """Send the local-time delivery slots that have come due"""
+        try:
+            with app.app_context():
+                due = self.local_delivery.tick(hour, minute)
+                if not due:
+                    return
+                
+                settings = get_settings_snapshot()
+                if not settings or not settings.wisher_name:
+                    logger.warning(f"Settings not configured - skipping {len(due)} local-time slot(s)")
+                    return
+                
+                whatsapp_service = create_whatsapp_service(settings.to_dict())
+                if not whatsapp_service.is_configured():
+                    logger.warning(f"WhatsApp integration not configured - skipping {len(due)} local-time slot(s)")
+                    return
+                
+                with profile_scheduler_run('local_delivery'):
+                    for fire_at, delivery_date, contact_ids in due:
+                        contacts = list(iter_contacts_by_ids(contact_ids))
+                        logger.info(
+                            f"Local-time slot {fire_at.isoformat()}: {len(contacts)} birthday(s) on {delivery_date.isoformat()}"
+                        )
+                        if contacts:
+                            self.send_and_log(contacts, delivery_date, settings, whatsapp_service, processes)
+        
+        except Exception as e:
+            logger.error(f"Error during local-time delivery: {str(e)}")
+
     def start_interval_check(self, minutes: int = 5):
         """Start an interval job to run every N minutes"""
         try:
@@ -76,16 +306,16 @@ class BirthdayScheduler:
             # Remove existing job if present
             if self.scheduler.get_job('interval_birthday_check'):
                 self.scheduler.remove_job('interval_birthday_check')
+            self._stop_local_delivery_for("interval check")
 
             self.scheduler.add_job(
-                func=self.check_and_send_birthday_messages,
+                func=run_birthday_check,
                 trigger=IntervalTrigger(minutes=minutes),
                 id='interval_birthday_check',
                 name=f'Interval Birthday Check ({minutes}m)',
                 replace_existing=True
             )
 
-            self.is_interval_running = True
             logger.info(f"Interval birthday check scheduled every {minutes} minute(s)")
             return True, f"Interval scheduler started - every {minutes} minute(s)"
 
@@ -98,7 +328,6 @@ class BirthdayScheduler:
         try:
             if self.scheduler.get_job('interval_birthday_check'):
                 self.scheduler.remove_job('interval_birthday_check')
-                self.is_interval_running = False
                 logger.info("Interval birthday check stopped")
                 # Also remove any pending end timer
                 if self.scheduler.get_job(self.interval_end_job_id):
@@ -137,7 +366,7 @@ class BirthdayScheduler:
                 self.scheduler.remove_job(self.interval_end_job_id)
 
             self.scheduler.add_job(
-                func=self.stop_interval_check,
+                func=run_interval_end,
                 trigger=DateTrigger(run_date=end_dt, timezone=ist),
                 id=self.interval_end_job_id,
                 name=f'Interval End Timer ({end_dt.isoformat()})',
@@ -150,14 +379,14 @@ class BirthdayScheduler:
             logger.error(f"Failed to start interval-until scheduler: {str(e)}")
             return False, f"Failed to start interval-until scheduler: {str(e)}"
     
-    def check_and_send_birthday_messages(self):
+    def check_and_send_birthday_messages(self, processes=None):
         """Check for today's birthdays and send messages"""
         logger.info("Starting daily birthday check...")
         
         try:
             with app.app_context():
                 # Get settings
-                settings = Settings.query.first()
+                settings = get_settings_snapshot()
                 if not settings or not settings.wisher_name:
                     logger.warning("Settings not configured - skipping birthday check")
                     return
@@ -170,55 +399,99 @@ class BirthdayScheduler:
                     return
                 
                 # Get today's birthdays
-                today = date.today()
-                birthday_contacts = Contact.query.filter(
-                    db.extract('month', Contact.birthdate) == today.month,
-                    db.extract('day', Contact.birthdate) == today.day
-                ).all()
+                today = get_local_today()
+                birthday_contacts = get_birthday_contacts(today)
                 
                 if not birthday_contacts:
                     logger.info("No birthdays today")
                     return
                 
                 logger.info(f"Found {len(birthday_contacts)} birthday(s) today")
-                
-                sent_count = 0
-                failed_count = 0
-                
-                for contact in birthday_contacts:
-                    try:
-                        success, message = whatsapp_service.send_birthday_message(
-                            contact.name, 
-                            contact.whatsapp_number, 
-                            settings.wisher_name
-                        )
-                        
-                        if success:
-                            sent_count += 1
-                            logger.info(f"Birthday message sent to {contact.name}")
-                        else:
-                            failed_count += 1
-                            logger.error(f"Failed to send birthday message to {contact.name}: {message}")
-                    
-                    except Exception as e:
-                        failed_count += 1
-                        logger.error(f"Error sending message to {contact.name}: {str(e)}")
-                
-                logger.info(f"Birthday check completed - Sent: {sent_count}, Failed: {failed_count}")
+                self.send_and_log(birthday_contacts, today, settings, whatsapp_service, processes)
                 
         except Exception as e:
             logger.error(f"Error during birthday check: {str(e)}")
     
+    def send_and_log(self, contacts, delivery_date, settings, whatsapp_service, processes=None):
+        """Send one batch of birthday messages, sharded if configured, and log the outcome"""
+        processes = processes or self.dispatch_processes
+        if processes > 1:
+            results, skipped_count = self.send_sharded(contacts, delivery_date, processes)
+        else:
+            results, skipped_count = send_birthday_batch(
+                whatsapp_service,
+                contacts,
+                settings.wisher_name,
+                delivery_date,
+                max_workers=self.dispatch_workers,
+                template_set=settings.message_template_set
+            )
+        
+        sent_count = 0
+        failed_count = 0
+        
+        for result in results:
+            if result['success']:
+                sent_count += 1
+                logger.info("Birthday message sent to %s", result['contact_name'], extra=SAMPLED)
+            else:
+                failed_count += 1
+                logger.error(f"Failed to send birthday message to {result['contact_name']}: {result['message']}")
+        
+        logger.info(f"Birthday check completed - Sent: {sent_count}, Failed: {failed_count}, Skipped: {skipped_count}")
+    
+    def send_sharded(self, contacts, today, processes=None):
+        """Send from worker processes (dispatch_processes by default) and merge their results"""
+        reports = send_birthday_shards(
+            [contact.id for contact in contacts],
+            today,
+            processes or self.dispatch_processes,
+            max_workers=self.dispatch_workers
+        )
+        contacts_by_id = {contact.id: contact for contact in contacts}
+        results = []
+        skipped_count = 0
+        for report in reports:
+            if report.get('error'):
+                # A crashed shard's outcomes come from the ledger; its unfinished sends are already queued for retry
+                logger.warning(
+                    f"Shard {report['shard']} crashed: {report['contacts']} contact(s) - "
+                    f"Sent: {report['sent']}, Failed: {report['failed']}, Skipped: {report['skipped']}"
+                )
+                results.extend({
+                    'contact_name': contacts_by_id[contact_id].name,
+                    'contact_number': contacts_by_id[contact_id].send_number,
+                    'success': success,
+                    'message': message,
+                    'error_class': error_class
+                } for contact_id, success, message, error_class in report['outcomes'])
+                skipped_count += report['skipped']
+                continue
+            logger.info(
+                f"Shard {report['shard']}: {report['contacts']} contact(s) in {report['seconds']:.2f}s - "
+                f"Sent: {report['sent']}, Failed: {report['failed']}, Skipped: {report['skipped']}"
+            )
+            results.extend(report['results'])
+            skipped_count += report['skipped']
+        return results, skipped_count
+    
+    def drain_retry_queue(self):
+        """Re-send failed messages whose retry backoff has elapsed"""
+        try:
+            drain_retry_queue(max_workers=self.dispatch_workers)
+        except Exception as e:
+            logger.error(f"Error draining retry queue: {str(e)}")
+    
     def run_manual_check(self):
         """Run birthday check manually (for testing)"""
         logger.info("Running manual birthday check...")
         
-        # Run in a separate thread to avoid blocking
-        thread = threading.Thread(target=self.check_and_send_birthday_messages)
-        thread.daemon = True
-        thread.start()
+        # Run as a tracked send job; progress is at /api/whatsapp/jobs/<id>
+        with app.app_context():
+            job = start_send_job(get_local_today(), kind='manual', max_workers=self.dispatch_workers)
+            job_id = job.id
         
-        return True, "Manual birthday check started"
+        return True, f"Manual birthday check started (job {job_id})", job_id
     
     def get_status(self):
         """Get scheduler status"""
@@ -226,6 +499,7 @@ class BirthdayScheduler:
         daily_job = self.scheduler.get_job('daily_birthday_check')
         interval_job = self.scheduler.get_job('interval_birthday_check')
         interval_end_job = self.scheduler.get_job(self.interval_end_job_id)
+        local_job = self.scheduler.get_job(LOCAL_DELIVERY_JOB_ID)
 
         status = {
             'job_count': len(jobs),
@@ -249,56 +523,48 @@ class BirthdayScheduler:
             except Exception:
                 pass
 
+        status['local_delivery'] = dict(
+            self.local_delivery.get_status(),
+            running=bool(local_job),
+            send_time=f"{local_job.kwargs['hour']:02d}:{local_job.kwargs['minute']:02d}" if local_job else None
+        )
+        
         # Back-compat top-level flags
-        status['running'] = bool(daily_job or interval_job)
+        status['running'] = bool(daily_job or interval_job or local_job)
         status['next_run'] = status['daily']['next_run'] or status['interval']['next_run']
+        status['leader'] = dict(self.lease.get_status(), is_leader=self.is_leader)
+        try:
+            with app.app_context():
+                status['senders'] = get_sender_pool_status()
+        except Exception as e:
+            logger.warning(f"Could not load sender pool status: {e}")
+            status['senders'] = []
         return status
     
     def get_next_birthdays(self, days_ahead=7):
         """Get upcoming birthdays in the next N days"""
         try:
             with app.app_context():
-                upcoming = []
-                today = date.today()
-                
-                contacts = Contact.query.all()
-                
-                for contact in contacts:
-                    # Calculate next birthday
-                    birth_month = contact.birthdate.month
-                    birth_day = contact.birthdate.day
-                    
-                    # Try this year first
-                    try:
-                        next_birthday = date(today.year, birth_month, birth_day)
-                        if next_birthday < today:
-                            # Birthday already passed this year, use next year
-                            next_birthday = date(today.year + 1, birth_month, birth_day)
-                    except ValueError:
-                        # Handle leap year edge case (Feb 29)
-                        next_birthday = date(today.year + 1, birth_month, birth_day)
-                    
-                    days_until = (next_birthday - today).days
-                    
-                    if 0 <= days_until <= days_ahead:
-                        upcoming.append({
-                            'contact': contact.to_dict(),
-                            'next_birthday': next_birthday.isoformat(),
-                            'days_until': days_until
-                        })
-                
-                # Sort by days until birthday
-                upcoming.sort(key=lambda x: x['days_until'])
-                
-                return upcoming
+                return list_upcoming_birthdays(get_local_today(), days_ahead)
                 
         except Exception as e:
             logger.error(f"Error getting upcoming birthdays: {str(e)}")
             return []
 
-# Global scheduler instance
-birthday_scheduler = BirthdayScheduler()
+# Global scheduler instance, created on first use
+_birthday_scheduler = None
+_scheduler_lock = threading.Lock()
 
 def get_scheduler():
-    """Get the global scheduler instance"""
-    return birthday_scheduler
+    """Get the global scheduler instance, starting it on first call"""
+    global _birthday_scheduler
+    if _birthday_scheduler is None:
+        with _scheduler_lock:
+            if _birthday_scheduler is None:
+                _birthday_scheduler = BirthdayScheduler()
+    return _birthday_scheduler
+
+def shutdown_scheduler():
+    """Stop this process's scheduler, if one was started, and release its lease"""
+    if _birthday_scheduler is not None:
+        _birthday_scheduler.shutdown()
@@ -0,0 +1,146 @@
+"""
+Background send jobs for bulk birthday messages
+
+A job row is created and committed before the work starts, so the caller
+gets a job id straight away and any process can report progress from the
+database. The job sends in chunks through the delivery ledger, updating
+its counters and checking for cancellation between chunks; per-contact
+results are stored on the row once it stops.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app import app, db, SendJob, get_birthday_contacts, get_settings_snapshot
+from delivery_ledger import send_birthday_batch
+from whatsapp_service import create_whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_CANCELLED = 'cancelled'
+JOB_FAILED = 'failed'
+
+FINISHED_STATUSES = (JOB_COMPLETED, JOB_CANCELLED, JOB_FAILED)
+
+# Contacts sent between progress updates and cancellation checks
+SEND_JOB_CHUNK_SIZE = int(os.environ.get('SEND_JOB_CHUNK_SIZE', 50))
+
+# Send jobs that may run at once in this process
+SEND_JOB_CONCURRENCY = int(os.environ.get('SEND_JOB_CONCURRENCY', 2))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SEND_JOB_CONCURRENCY, thread_name_prefix='send-job')
+        return _executor
+
+def start_send_job(delivery_date, kind='api', max_workers=None):
+    """Create a queued job for delivery_date's birthdays and run it in the background"""
+    job = SendJob(kind=kind, status=JOB_QUEUED, delivery_date=delivery_date)
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(_run_job, job.id, max_workers)
+    logger.info(f"Send job {job.id} queued ({kind}) for {delivery_date.isoformat()}")
+    return job
+
+def cancel_send_job(job_id):
+    """Request cancellation; returns the job, or None if it does not exist
+
+    A queued job is cancelled at once; a running job stops after its
+    current chunk.
+    """
+    job = db.session.get(SendJob, job_id)
+    if job is None:
+        return None
+    if job.status not in FINISHED_STATUSES:
+        SendJob.query.filter(SendJob.id == job_id, SendJob.status == JOB_QUEUED).update({
+            SendJob.status: JOB_CANCELLED,
+            SendJob.finished_at: datetime.utcnow()
+        }, synchronize_session=False)
+        SendJob.query.filter(SendJob.id == job_id).update(
+            {SendJob.cancel_requested: True}, synchronize_session=False
+        )
+        db.session.commit()
+        db.session.refresh(job)
+    return job
+
+def _set_job(job_id, **values):
+    SendJob.query.filter(SendJob.id == job_id).update(
+        {getattr(SendJob, name): value for name, value in values.items()}, synchronize_session=False
+    )
+    db.session.commit()
+
+def _cancel_requested(job_id):
+    return bool(db.session.query(SendJob.cancel_requested).filter(SendJob.id == job_id).scalar())
+
+def _run_job(job_id, max_workers=None):
+    with app.app_context():
+        results = []
+        try:
+            # Claim the job; it may have been cancelled while queued
+            started = SendJob.query.filter(SendJob.id == job_id, SendJob.status == JOB_QUEUED).update({
+                SendJob.status: JOB_RUNNING,
+                SendJob.started_at: datetime.utcnow()
+            }, synchronize_session=False)
+            db.session.commit()
+            if not started:
+                return
+
+            job = db.session.get(SendJob, job_id)
+            delivery_date = job.delivery_date
+            settings = get_settings_snapshot()
+            if not settings or not settings.wisher_name:
+                _set_job(job_id, status=JOB_FAILED, error='Settings not configured', finished_at=datetime.utcnow())
+                return
+            whatsapp_service = create_whatsapp_service(settings.to_dict())
+            if not whatsapp_service.is_configured():
+                _set_job(job_id, status=JOB_FAILED, error='WhatsApp integration not configured',
+                         finished_at=datetime.utcnow())
+                return
+
+            contacts = get_birthday_contacts(delivery_date)
+            _set_job(job_id, total_count=len(contacts))
+            sent_count = failed_count = skipped_count = 0
+            started_at = time.perf_counter()
+
+            for start in range(0, len(contacts), SEND_JOB_CHUNK_SIZE):
+                if _cancel_requested(job_id):
+                    _set_job(job_id, status=JOB_CANCELLED, results=json.dumps(results),
+                             finished_at=datetime.utcnow())
+                    logger.info(f"Send job {job_id} cancelled after {len(results)} send(s)")
+                    return
+
+                chunk = contacts[start:start + SEND_JOB_CHUNK_SIZE]
+                chunk_results, chunk_skipped = send_birthday_batch(
+                    whatsapp_service, chunk, settings.wisher_name, delivery_date, max_workers=max_workers,
+                    template_set=settings.message_template_set
+                )
+                results.extend(chunk_results)
+                sent_count += sum(1 for result in chunk_results if result['success'])
+                failed_count += sum(1 for result in chunk_results if not result['success'])
+                skipped_count += chunk_skipped
+                _set_job(job_id, sent_count=sent_count, failed_count=failed_count, skipped_count=skipped_count)
+
+            _set_job(job_id, status=JOB_COMPLETED, results=json.dumps(results), finished_at=datetime.utcnow())
+            logger.info(
+                f"Send job {job_id} completed in {time.perf_counter() - started_at:.1f}s - "
+                f"Sent: {sent_count}, Failed: {failed_count}, Skipped: {skipped_count}"
+            )
+
+        except Exception as e:
+            logger.error(f"Send job {job_id} failed: {str(e)}")
+            db.session.rollback()
+            _set_job(job_id, status=JOB_FAILED, error=str(e), results=json.dumps(results),
+                     finished_at=datetime.utcnow())
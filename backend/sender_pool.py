@@ -0,0 +1,210 @@
+"""
+Spread birthday sends across a pool of Twilio sender numbers
+
+Each batch is planned up front with weighted rendezvous hashing: every
+contact ranks the healthy senders by a score derived from a hash of
+(contact id, sender number) scaled by the sender's weight, and goes to the
+best one with capacity left. A contact therefore sticks to the same sender
+from day to day, and adding, removing or benching one sender only moves
+that sender's share of contacts. A sender's weight is scaled by how much of
+its daily_limit is left, so a sender near its cap gets fewer contacts.
+
+After the batch, each sender's daily count and health are updated: any
+success clears its failure streak, and SENDER_FAILURE_THRESHOLD
+consecutive sender-side failures bench it for SENDER_COOLDOWN_SECONDS.
+With no senders configured, the number in Settings is used as before.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+from app import db, SenderNumber
+from phone_numbers import to_whatsapp_address
+from rate_limiter import get_rate_limiter_stats
+from whatsapp_service import create_whatsapp_service
+
+logger = logging.getLogger(__name__)
+
+SENDER_FAILURE_THRESHOLD = int(os.environ.get('SENDER_FAILURE_THRESHOLD', 5))
+SENDER_COOLDOWN_SECONDS = float(os.environ.get('SENDER_COOLDOWN_SECONDS', 300))
+
+# Failures that point at the sender (credentials, account, From number, Twilio or network trouble);
+# recipient-side 4xx errors never bench a sender, and throttling is left to its rate limiter
+SENDER_ERRORS = {'sender_error', 'server_error', 'network', 'twilio_error'}
+
+_HASH_SPACE = float(2 ** 64)
+
+# In-process throughput per sender number, from the batches this process sent
+_throughput = {}
+_throughput_lock = threading.Lock()
+
+def rendezvous_score(contact_id, sender_number, weight):
+    """Weighted rendezvous (highest random weight) score of a sender for a contact"""
+    digest = hashlib.blake2b(f"{contact_id}:{sender_number}".encode('utf-8'), digest_size=8).digest()
+    unit = (int.from_bytes(digest, 'big') + 0.5) / _HASH_SPACE
+    return weight / -math.log(unit)
+
+class SenderSlot:
+    """One sender in a planned batch"""
+    __slots__ = ('sender_id', 'number', 'service', 'weight', 'remaining')
+
+    def __init__(self, sender_id, number, service, weight, remaining=None):
+        self.sender_id = sender_id
+        self.number = number
+        self.service = service
+        self.weight = weight
+        # Messages left under the daily limit; None for no limit
+        self.remaining = remaining
+
+class SenderPool:
+    def __init__(self, slots):
+        self.slots = list(slots)
+
+    def rank(self, contact_id):
+        """Senders in preference order for a contact"""
+        return sorted(self.slots, key=lambda slot: rendezvous_score(contact_id, slot.number, slot.weight), reverse=True)
+
+    def assign(self, contacts):
+        """Pick a sender for each contact, in contact order
+
+        A contact whose preferred senders are all planned up to their daily
+        limit goes to its first choice anyway; the limit is a planning cap.
+        """
+        planned = Counter()
+        assignments = []
+        overflow = 0
+        for contact in contacts:
+            ranked = self.rank(contact.id)
+            chosen = next(
+                (slot for slot in ranked if slot.remaining is None or planned[slot.sender_id] < slot.remaining),
+                None
+            )
+            if chosen is None:
+                chosen = ranked[0]
+                overflow += 1
+            planned[chosen.sender_id] += 1
+            assignments.append(chosen)
+        if overflow:
+            logger.warning(f"{overflow} send(s) planned past their sender's daily limit")
+        return assignments
+
+    def record_results(self, assignments, results, day, elapsed):
+        """Update each sender's daily count, health and throughput after a batch"""
+        sent = Counter()
+        sender_failures = Counter()
+        failed = Counter()
+        last_error = {}
+        for slot, result in zip(assignments, results):
+            if result['success']:
+                sent[slot.sender_id] += 1
+            else:
+                failed[slot.sender_id] += 1
+                if result['error_class'] in SENDER_ERRORS:
+                    sender_failures[slot.sender_id] += 1
+                    last_error[slot.sender_id] = result['message']
+
+        now = datetime.utcnow()
+        for slot in self.slots:
+            values = {}
+            if sent[slot.sender_id]:
+                values[SenderNumber.sent_today] = db.case(
+                    (SenderNumber.sent_date == day, SenderNumber.sent_today + sent[slot.sender_id]),
+                    else_=sent[slot.sender_id]
+                )
+                values[SenderNumber.sent_date] = day
+                values[SenderNumber.consecutive_failures] = 0
+                values[SenderNumber.unhealthy_until] = None
+            elif sender_failures[slot.sender_id]:
+                values[SenderNumber.consecutive_failures] = (
+                    SenderNumber.consecutive_failures + sender_failures[slot.sender_id]
+                )
+                values[SenderNumber.last_error] = last_error[slot.sender_id]
+            if values:
+                SenderNumber.query.filter(SenderNumber.id == slot.sender_id).update(values, synchronize_session=False)
+
+            # Bench a sender whose failure streak reached the threshold
+            if sender_failures[slot.sender_id] and not sent[slot.sender_id]:
+                benched = SenderNumber.query.filter(
+                    SenderNumber.id == slot.sender_id,
+                    SenderNumber.consecutive_failures >= SENDER_FAILURE_THRESHOLD
+                ).update({
+                    SenderNumber.unhealthy_until: now + timedelta(seconds=SENDER_COOLDOWN_SECONDS)
+                }, synchronize_session=False)
+                if benched:
+                    logger.warning(
+                        f"Sender {slot.number} marked unhealthy for {SENDER_COOLDOWN_SECONDS:.0f}s: "
+                        f"{last_error[slot.sender_id]}"
+                    )
+        db.session.commit()
+
+        with _throughput_lock:
+            for slot in self.slots:
+                if not (sent[slot.sender_id] or failed[slot.sender_id]):
+                    continue
+                stats = _throughput.setdefault(slot.number, {'sent': 0, 'failed': 0})
+                stats['sent'] += sent[slot.sender_id]
+                stats['failed'] += failed[slot.sender_id]
+                stats['last_batch_messages_per_second'] = round(sent[slot.sender_id] / elapsed, 2) if elapsed else None
+                stats['last_batch_at'] = now.isoformat()
+
+def load_sender_pool(default_service, day):
+    """Build the pool of healthy senders for a batch; None to send from the Settings number
+
+    Senders without their own account use default_service's credentials.
+    """
+    senders = SenderNumber.query.filter(SenderNumber.enabled.is_(True)).order_by(SenderNumber.id).all()
+    if not senders:
+        return None
+
+    now = datetime.utcnow()
+    slots = []
+    for sender in senders:
+        if not sender.is_healthy(now):
+            continue
+        remaining = None
+        weight = sender.weight
+        if sender.daily_limit:
+            remaining = sender.daily_limit - sender.get_sent_on(day)
+            if remaining <= 0:
+                continue
+            weight *= remaining / sender.daily_limit
+        if weight <= 0:
+            continue
+        service = create_whatsapp_service({
+            'twilio_account_sid': sender.twilio_account_sid or default_service.account_sid,
+            'twilio_auth_token': sender.twilio_auth_token or default_service.auth_token,
+            'twilio_whatsapp_number': sender.whatsapp_number
+        })
+        if service.is_configured():
+            slots.append(SenderSlot(sender.id, sender.whatsapp_number, service, weight, remaining))
+
+    if not slots:
+        logger.warning("No healthy sender with capacity in the pool - sending from the Settings number")
+        return None
+    return SenderPool(slots)
+
+def plan_batch(default_service, contacts, day):
+    """Plan senders for contacts: (pool, assignments, services), or (None, None, None)"""
+    pool = load_sender_pool(default_service, day)
+    if pool is None:
+        return None, None, None
+    assignments = pool.assign(contacts)
+    return pool, assignments, [slot.service for slot in assignments]
+
+def get_sender_pool_status():
+    """Pool senders with their health, daily counts and this process's throughput"""
+    limiter_stats = get_rate_limiter_stats()
+    with _throughput_lock:
+        throughput = {number: dict(stats) for number, stats in _throughput.items()}
+    senders = []
+    for sender in SenderNumber.query.order_by(SenderNumber.id).all():
+        data = sender.to_dict()
+        data['throughput'] = throughput.get(sender.whatsapp_number)
+        data['rate_limit'] = limiter_stats.get(to_whatsapp_address(sender.whatsapp_number))
+        senders.append(data)
+    return senders
@@ -0,0 +1,64 @@
+"""
+Process-wide cache of the application settings
+
+Routes and scheduler runs read an immutable snapshot instead of querying
+the settings row every time. update_settings invalidates the cache in its
+own process; other processes notice the shared settings change counter
+(checked at most every SETTINGS_CHECK_SECONDS) and reload the row.
+"""
+
+import os
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_CHECK_INTERVAL = float(os.environ.get('SETTINGS_CHECK_SECONDS', 5))
+
+class SettingsSnapshot(namedtuple('SettingsSnapshot', [
+    'id', 'wisher_name', 'twilio_account_sid', 'twilio_auth_token', 'twilio_whatsapp_number',
+    'message_template_set'
+])):
+    """Read-only copy of the Settings row"""
+    __slots__ = ()
+
+    @classmethod
+    def from_model(cls, settings):
+        return cls(**{field: getattr(settings, field) for field in cls._fields})
+
+    def to_dict(self):
+        return self._asdict()
+
+class SettingsCache:
+    def __init__(self, load_settings, load_version, check_interval=DEFAULT_CHECK_INTERVAL):
+        """
+        load_settings: callable returning a SettingsSnapshot or None
+        load_version: callable returning the database settings change counter
+        """
+        self._load_settings = load_settings
+        self._load_version = load_version
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._snapshot = None
+        self._version = None
+        self._checked_at = 0.0
+
+    def get(self):
+        """Get the current settings snapshot (requires an app context)"""
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded and now - self._checked_at < self.check_interval:
+                return self._snapshot
+
+            version = self._load_version()
+            if not self._loaded or version != self._version:
+                self._snapshot = self._load_settings()
+                self._version = version
+                self._loaded = True
+            self._checked_at = now
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to reload the settings row"""
+        with self._lock:
+            self._loaded = False
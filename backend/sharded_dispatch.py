@@ -0,0 +1,122 @@
+"""
+Multi-process dispatch of a day's birthday messages
+
+Contacts are split into shards by a hash of their id, and each shard is
+sent by its own worker process with its own database session, Twilio
+client and a 1/N share of each sender's rate limit. The delivery ledger
+still guards every send. When a shard's process dies, its outcome is read
+back from the ledger: the sends it did not finish count as failed and go
+to the retry queue. Workers use the spawn start method so they never
+inherit the parent's scheduler threads or database connections.
+"""
+
+import logging
+import multiprocessing
+import os
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+
+logger = logging.getLogger(__name__)
+
+# Default number of dispatch processes for scheduled runs (1 = send in-process)
+DEFAULT_PROCESSES = int(os.environ.get('DISPATCH_PROCESSES', 1))
+
+def get_shard(contact_id, shard_count):
+    """Stable shard number for a contact id"""
+    return zlib.crc32(str(contact_id).encode('ascii')) % shard_count
+
+def split_into_shards(contact_ids, shard_count):
+    """Split contact ids into shard_count lists, keeping their order"""
+    shards = [[] for _ in range(shard_count)]
+    for contact_id in contact_ids:
+        shards[get_shard(contact_id, shard_count)].append(contact_id)
+    return shards
+
+def run_shard(shard, shard_count, contact_ids, delivery_date, max_workers=None):
+    """Worker process entry point: send one shard and report its results"""
+    from app import app, iter_contacts_by_ids, get_settings_snapshot
+    from delivery_ledger import send_birthday_batch
+    from rate_limiter import set_rate_share
+    from whatsapp_service import create_whatsapp_service
+
+    set_rate_share(1.0 / shard_count)
+    started = time.perf_counter()
+    with app.app_context():
+        settings = get_settings_snapshot()
+        whatsapp_service = create_whatsapp_service(settings.to_dict())
+        contacts = list(iter_contacts_by_ids(contact_ids))
+        results, skipped_count = send_birthday_batch(
+            whatsapp_service,
+            contacts,
+            settings.wisher_name,
+            date.fromisoformat(delivery_date),
+            max_workers=max_workers,
+            template_set=settings.message_template_set
+        )
+    return {
+        'shard': shard,
+        'contacts': len(contact_ids),
+        'sent': sum(1 for result in results if result['success']),
+        'failed': sum(1 for result in results if not result['success']),
+        'skipped': skipped_count,
+        'seconds': round(time.perf_counter() - started, 3),
+        'results': results
+    }
+
+def _crashed_shard_report(shard, contact_ids, delivery_date, started, error):
+    """Report for a shard whose process died, rebuilt from the ledger
+
+    Rows the shard wrote since started are its outcomes; contacts it left
+    pending or never claimed are unfinished, count as failed and go to the
+    retry queue; the rest were skipped as already handled.
+    """
+    from delivery_ledger import STATUS_PENDING, STATUS_SENT, get_delivery_rows, queue_unfinished_sends
+
+    rows = get_delivery_rows(contact_ids, delivery_date)
+    outcomes = []
+    unfinished = []
+    skipped_count = 0
+    for contact_id in contact_ids:
+        row = rows.get(contact_id)
+        if row is None or row.status == STATUS_PENDING:
+            unfinished.append(contact_id)
+            outcomes.append((contact_id, False, error, 'dispatch_error'))
+        elif row.updated_at >= started:
+            outcomes.append((contact_id, row.status == STATUS_SENT, row.last_message, row.error_class))
+        else:
+            skipped_count += 1
+
+    queued = queue_unfinished_sends(unfinished, delivery_date, error)
+    logger.error(f"{error} - {queued} unfinished send(s) moved to the retry queue")
+    sent_count = sum(1 for outcome in outcomes if outcome[1])
+    return {'shard': shard, 'contacts': len(contact_ids), 'sent': sent_count, 'failed': len(outcomes) - sent_count,
+            'skipped': skipped_count, 'seconds': None, 'outcomes': outcomes, 'error': error}
+
+def send_birthday_shards(contact_ids, delivery_date, processes, max_workers=None):
+    """Send to contact_ids from `processes` worker processes
+
+    The caller checks that settings and Twilio are configured first, and
+    calls this inside an app context. Returns one report per non-empty
+    shard, ordered by shard number. A crashed shard's report has an error
+    and, instead of results, (contact_id, success, message, error_class)
+    outcomes for the contacts it handled or left unfinished.
+    """
+    shard_count = max(1, processes)
+    shards = split_into_shards(contact_ids, shard_count)
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    started = datetime.utcnow()
+    with ProcessPoolExecutor(max_workers=shard_count, mp_context=context) as pool:
+        futures = [
+            (shard, ids, pool.submit(run_shard, shard, shard_count, ids, delivery_date.isoformat(), max_workers))
+            for shard, ids in enumerate(shards) if ids
+        ]
+        for shard, ids, future in futures:
+            try:
+                reports.append(future.result())
+            except Exception as e:
+                error = f"Dispatch shard {shard} failed: {str(e)}"
+                reports.append(_crashed_shard_report(shard, ids, delivery_date, started, error))
+    return reports
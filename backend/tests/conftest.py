@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Point the app at a scratch SQLite database before it is imported
+_DB_DIR = tempfile.mkdtemp(prefix='birthday-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_DB_DIR, 'test.db')
+os.environ.pop('RENDER', None)
+os.environ.pop('FLASK_ENV', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def app():
+    """The Flask app with empty tables and cleared in-process caches"""
+    from app import app as flask_app, db, birthday_index, settings_cache, response_cache
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        birthday_index.invalidate()
+        settings_cache.invalidate()
+        response_cache.clear()
+        yield flask_app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,74 @@
+from datetime import date
+
+from birthday_index import BirthdayCalendarIndex
+
+class FakeContacts:
+    """(contact_id, birthday_key) rows and the contacts change counter"""
+
+    def __init__(self, rows):
+        self.rows = list(rows)
+        self.version = 1
+        self.loads = 0
+
+    def load_rows(self):
+        self.loads += 1
+        return list(self.rows)
+
+    def load_version(self):
+        return self.version
+
+def _index(contacts, check_interval=0):
+    return BirthdayCalendarIndex(contacts.load_rows, contacts.load_version, check_interval=check_interval)
+
+def test_build_buckets_contacts_by_birthday():
+    contacts = FakeContacts([(1, 1016), (2, 1016), (3, 1017), (4, 229), (5, None)])
+    index = _index(contacts)
+    assert index.ids_for_day(date(2026, 10, 16)) == [1, 2]
+    # Feb 29 birthdays are celebrated on Feb 28 in non-leap years
+    assert index.ids_for_day(date(2026, 2, 28)) == [4]
+    assert index.upcoming(date(2026, 10, 16), 1) == [[1, 2], [3]]
+    assert index.get_status()['contact_count'] == 4
+    assert contacts.loads == 1
+
+def test_move_and_remove_keep_the_count():
+    contacts = FakeContacts([(1, 1016), (2, 1017)])
+    index = _index(contacts, check_interval=60)
+    index.ensure_current()
+
+    index.move(1, 1016, 1017, version=2)
+    assert index.ids_for_day(date(2026, 10, 16)) == []
+    assert index.ids_for_day(date(2026, 10, 17)) == [1, 2]
+
+    index.add(2, 1017, version=3)
+    index.move(1, None, 1017, version=4)
+    assert index.get_status()['contact_count'] == 2
+
+    index.remove(2, 1017, version=5)
+    index.remove(2, 1017, version=6)
+    assert index.ids_for_day(date(2026, 10, 17)) == [1]
+    assert index.get_status()['contact_count'] == 1
+    assert contacts.loads == 1
+
+def test_version_gap_rebuilds_on_the_next_lookup():
+    contacts = FakeContacts([(1, 1016)])
+    index = _index(contacts, check_interval=60)
+    index.ensure_current()
+
+    # Another process added contact 2 (version 2) before this one wrote version 3
+    contacts.rows.append((2, 1016))
+    contacts.rows.append((3, 1016))
+    contacts.version = 3
+    index.add(3, 1016, version=3)
+    assert index.ids_for_day(date(2026, 10, 16)) == [1, 2, 3]
+    assert contacts.loads == 2
+
+def test_consecutive_version_skips_the_rebuild():
+    contacts = FakeContacts([(1, 1016)])
+    index = _index(contacts, check_interval=0)
+    index.ensure_current()
+
+    contacts.rows.append((2, 1016))
+    contacts.version = 2
+    index.add(2, 1016, version=2)
+    assert index.ids_for_day(date(2026, 10, 16)) == [1, 2]
+    assert contacts.loads == 1
@@ -0,0 +1,74 @@
+import io
+
+from app import Contact
+from contact_import import iter_rows
+
+CSV = 'name,birthdate,whatsapp_number,timezone\nAsha,1990-02-02,+91 98765 43210,Asia/Kolkata\n"Ravi\nKumar",1991-03-03,+91 98765 43211,\n'
+
+class BareUpload:
+    """A file object with only read() and iteration, like SpooledTemporaryFile before Python 3.11"""
+
+    def __init__(self, data):
+        self._buffer = io.BytesIO(data)
+
+    def read(self, size=-1):
+        return self._buffer.read(size)
+
+    def __iter__(self):
+        return iter(self._buffer)
+
+def test_iter_rows_reads_streams_textiowrapper_cannot_wrap():
+    rows = list(iter_rows(BareUpload(('\ufeff' + CSV).encode('utf-8')), 'csv'))
+    assert [row['name'] for _, row, _ in rows] == ['Asha', 'Ravi\nKumar']
+    assert rows[0][1]['timezone'] == 'Asia/Kolkata'
+
+def test_iter_rows_reads_ndjson():
+    data = b'{"name": "Asha"}\n\nnot json\n[1]\n{"name": "\xff"}\n'
+    assert list(iter_rows(BareUpload(data), 'ndjson')) == [
+        (1, {'name': 'Asha'}, None),
+        (3, None, 'Invalid JSON'),
+        (4, None, 'Invalid JSON object'),
+        (5, None, 'Invalid UTF-8')
+    ]
+
+def test_iter_rows_rejects_only_the_csv_row_that_is_not_utf8():
+    data = CSV.encode('utf-8') + b'B\xe9la,1992-04-04,+91 98765 43212,\n'
+    rows = list(iter_rows(BareUpload(data), 'csv'))
+    assert [row['name'] for _, row, _ in rows[:2]] == ['Asha', 'Ravi\nKumar']
+    assert rows[2] == (5, None, 'Invalid UTF-8')
+
+def test_multipart_csv_import(client):
+    response = client.post(
+        '/api/contacts/import',
+        data={'file': (io.BytesIO(CSV.encode('utf-8')), 'contacts.csv')},
+        content_type='multipart/form-data'
+    )
+    assert response.status_code == 200
+    assert response.get_json()['imported'] == 2
+    assert Contact.query.filter_by(name='Asha').one().whatsapp_e164 == '+919876543210'
+
+def test_multipart_ndjson_import(client):
+    data = b'{"name": "Asha", "birthdate": "1990-02-02", "whatsapp_number": "+919876543210"}\n'
+    response = client.post(
+        '/api/contacts/import',
+        data={'file': (io.BytesIO(data), 'contacts.ndjson')},
+        content_type='multipart/form-data'
+    )
+    assert response.get_json()['imported'] == 1
+
+def test_ndjson_import_reports_bad_rows_and_keeps_going(client):
+    data = (
+        b'{"name": "Asha", "birthdate": "1990-02-02", "whatsapp_number": 919876543210}\n'
+        b'{"name": "Ravi", "birthdate": "1991-03-03", "whatsapp_number": ["+919876543211"]}\n'
+        b'{"name": "Bela", "birthdate": \n'
+        b'{"name": "Chen", "birthdate": "1992-04-04", "whatsapp_number": "+919876543212"}\n'
+    )
+    response = client.post('/api/contacts/import?format=ndjson', data=data, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    report = response.get_json()
+    assert (report['total_rows'], report['imported'], report['failed']) == (4, 2, 2)
+    assert report['errors'] == [
+        {'row': 2, 'error': 'whatsapp_number must be a string'},
+        {'row': 3, 'error': 'Invalid JSON'}
+    ]
+    assert Contact.query.filter_by(name='Asha').one().whatsapp_e164 == '+919876543210'
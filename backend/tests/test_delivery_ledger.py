@@ -0,0 +1,166 @@
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+from requests.exceptions import ConnectionError
+from twilio.base.exceptions import TwilioException, TwilioRestException
+
+from app import db, MessageDelivery
+from delivery_ledger import (
+    RETRY_MAX_ATTEMPTS, STALE_CLAIM_MINUTES, Claim, claim_deliveries, force_claim_delivery,
+    queue_unfinished_sends, record_deliveries
+)
+from whatsapp_service import classify_send_error
+
+DAY = date(2026, 10, 16)
+
+def _row(contact_id, day=DAY):
+    return MessageDelivery.query.filter_by(contact_id=contact_id, delivery_date=day).one()
+
+def test_claim_is_exclusive_until_recorded(app):
+    first = claim_deliveries([1, 2], DAY)
+    assert set(first) == {1, 2}
+    assert claim_deliveries([1, 2, 3], DAY).keys() == {3}
+
+def test_concurrent_claims_hand_out_each_contact_once(app):
+    contact_ids = list(range(1, 51))
+    barrier = threading.Barrier(4)
+    claimed = []
+    errors = []
+
+    def run():
+        with app.app_context():
+            try:
+                barrier.wait()
+                claimed.append(claim_deliveries(contact_ids, DAY))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                db.session.remove()
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    winners = [contact_id for claims in claimed for contact_id in claims]
+    assert sorted(winners) == contact_ids
+    assert MessageDelivery.query.count() == len(contact_ids)
+
+def test_failed_and_stale_claims_can_be_reclaimed(app):
+    claim_deliveries([1, 2, 3], DAY)
+    _row(1).status = 'failed'
+    _row(2).updated_at = datetime.utcnow() - timedelta(minutes=STALE_CLAIM_MINUTES + 1)
+    db.session.commit()
+
+    reclaimed = claim_deliveries([1, 2, 3], DAY)
+    assert reclaimed.keys() == {1, 2}
+    assert all(claim.attempts == 2 for claim in reclaimed.values())
+
+def test_reclaim_loses_to_a_concurrent_update(app):
+    claim_deliveries([1], DAY)
+    row = _row(1)
+    row.status = 'failed'
+    db.session.commit()
+    original_query = db.session.query
+
+    class RacingQuery:
+        """Lets another run reclaim the row right after the ledger snapshot is read"""
+
+        def __init__(self, query):
+            self.query = query
+
+        def filter(self, *criteria):
+            rows = self.query.filter(*criteria).all()
+            MessageDelivery.query.filter_by(id=row.id).update({
+                MessageDelivery.status: 'pending',
+                MessageDelivery.updated_at: datetime.utcnow()
+            }, synchronize_session=False)
+            return rows
+
+    db.session.query = lambda *entities: RacingQuery(original_query(*entities))
+    try:
+        assert claim_deliveries([1], DAY) == {}
+    finally:
+        del db.session.query
+    assert _row(1).attempts == 1
+
+@pytest.mark.parametrize('error_class, status', [
+    ('throttled', 'retry'),
+    ('server_error', 'retry'),
+    ('network', 'retry'),
+    ('invalid_number', 'dead'),
+    ('client_error', 'dead'),
+    ('sender_error', 'dead'),
+    ('twilio_error', 'dead'),
+    ('unexpected', 'dead'),
+])
+def test_failures_are_classified_for_retry(app, error_class, status):
+    claimed = claim_deliveries([1], DAY)
+    record_deliveries(claimed, [(1, False, 'boom', error_class)])
+
+    row = _row(1)
+    assert row.status == status
+    assert row.error_class == error_class
+    assert (row.next_attempt_at is not None) == (status == 'retry')
+
+def test_retryable_failure_on_last_attempt_is_dead(app):
+    claimed = claim_deliveries([1], DAY)
+    claimed[1] = Claim(claimed[1].id, RETRY_MAX_ATTEMPTS)
+    record_deliveries(claimed, [(1, False, 'Twilio 503', 'server_error')])
+    assert _row(1).status == 'dead'
+
+def test_success_is_recorded_as_sent(app):
+    claimed = claim_deliveries([1], DAY)
+    record_deliveries(claimed, [(1, True, 'SM123', None)])
+    row = _row(1)
+    assert row.status == 'sent'
+    assert row.next_attempt_at is None
+
+def test_forced_send_is_recorded_over_a_sent_row(app):
+    claimed = claim_deliveries([1], DAY)
+    record_deliveries(claimed, [(1, True, 'SM1', None)])
+
+    forced = force_claim_delivery(1, DAY)
+    assert forced[1] == Claim(claimed[1].id, 2)
+    assert _row(1).status == 'pending'
+
+    record_deliveries(forced, [(1, False, 'Twilio 429', 'throttled')])
+    row = _row(1)
+    assert row.status == 'retry'
+    assert row.attempts == 2
+
+def test_forced_send_creates_the_row(app):
+    forced = force_claim_delivery(7, DAY)
+    assert forced[7].attempts == 1
+    assert _row(7).status == 'pending'
+
+def test_unfinished_sends_go_to_the_retry_queue(app):
+    claimed = claim_deliveries([1, 2, 3], DAY)
+    record_deliveries({1: claimed[1]}, [(1, True, 'SM1', None)])
+    _row(3).attempts = RETRY_MAX_ATTEMPTS
+    db.session.commit()
+
+    assert queue_unfinished_sends([1, 2, 3, 4], DAY, 'Dispatch shard 0 failed') == 3
+    assert _row(1).status == 'sent'
+    assert _row(2).status == 'retry'
+    assert _row(3).status == 'dead'
+    row = _row(4)
+    assert (row.status, row.attempts, row.error_class) == ('retry', 0, 'dispatch_error')
+    assert row.next_attempt_at is not None
+
+@pytest.mark.parametrize('error, error_class', [
+    (lambda: TwilioRestException(400, '/Messages', code=21211), 'invalid_number'),
+    (lambda: TwilioRestException(429, '/Messages'), 'throttled'),
+    (lambda: TwilioRestException(503, '/Messages'), 'server_error'),
+    (lambda: TwilioRestException(401, '/Messages', code=20003), 'sender_error'),
+    (lambda: TwilioRestException(400, '/Messages', code=21212), 'sender_error'),
+    (lambda: TwilioRestException(400, '/Messages', code=21610), 'client_error'),
+    (lambda: ConnectionError('reset'), 'network'),
+    (lambda: TwilioException('bad config'), 'twilio_error'),
+    (lambda: ValueError('bug'), 'unexpected'),
+])
+def test_send_errors_are_classified(error, error_class):
+    assert classify_send_error(error()) == error_class
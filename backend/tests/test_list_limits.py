@@ -0,0 +1,21 @@
+import pytest
+
+@pytest.mark.parametrize('path', ['/api/deliveries/retry-queue', '/api/deliveries/dead-letters'])
+@pytest.mark.parametrize('limit', [0, -1, 1001])
+def test_delivery_lists_reject_out_of_range_limits(client, path, limit):
+    response = client.get(f'{path}?limit={limit}')
+    assert response.status_code == 400
+
+def test_delivery_lists_accept_limits_in_range(client):
+    response = client.get('/api/deliveries/dead-letters?limit=1000')
+    assert response.status_code == 200
+    assert response.get_json()['count'] == 0
+
+@pytest.mark.parametrize('limit', [0, -1, 101])
+def test_job_list_rejects_out_of_range_limits(client, limit):
+    response = client.get(f'/api/whatsapp/jobs?limit={limit}')
+    assert response.status_code == 400
+
+def test_job_list_accepts_limits_in_range(client):
+    response = client.get('/api/whatsapp/jobs?limit=100')
+    assert response.status_code == 200
@@ -0,0 +1,128 @@
+from datetime import date, datetime
+
+import pytz
+
+from app import db, Contact, get_data_version, bump_data_version
+from delivery_ledger import claim_deliveries, record_deliveries, send_birthday_batch
+from local_delivery import LocalTimeDelivery, local_send_time
+from scheduler_service import _load_local_delivery_rows
+from utils import get_birthday_key
+
+DAY = date(2026, 3, 20)
+DEFAULT_TIMEZONE = 'Asia/Kolkata'
+
+def utc(*args):
+    return datetime(*args, tzinfo=pytz.utc)
+
+class FakeContacts:
+    """Birthday rows by day, with the change counter the delivery plan watches"""
+
+    def __init__(self, rows_by_day):
+        self.rows_by_day = rows_by_day
+        self.version = 1
+
+    def load(self, day):
+        return self.rows_by_day.get(day, [])
+
+    def change(self, rows_by_day):
+        self.rows_by_day = rows_by_day
+        self.version += 1
+
+def _delivery(contacts, catch_up_seconds=60):
+    return LocalTimeDelivery(contacts.load, lambda: contacts.version, DEFAULT_TIMEZONE, catch_up_seconds, plan_hours=36)
+
+def _fired(delivery, now, hour=9, minute=0):
+    return [(fire_at, day, sorted(contact_ids)) for fire_at, day, contact_ids in delivery.tick(hour, minute, now)]
+
+def test_tick_fires_at_nine_local_in_each_timezone():
+    contacts = FakeContacts({DAY: [(1, 'Asia/Kolkata'), (2, 'America/New_York'), (3, None), (4, 'Pacific/Kiritimati')]})
+    delivery = _delivery(contacts)
+
+    assert _fired(delivery, utc(2026, 3, 19, 12)) == []
+    # UTC+14 reaches 09:00 on its local birthday while it is still the day before in UTC
+    assert _fired(delivery, utc(2026, 3, 19, 19)) == [(utc(2026, 3, 19, 19), DAY, [4])]
+    assert _fired(delivery, utc(2026, 3, 20, 3, 29)) == []
+    # Contacts without a timezone use the default one
+    assert _fired(delivery, utc(2026, 3, 20, 3, 30)) == [(utc(2026, 3, 20, 3, 30), DAY, [1, 3])]
+    assert _fired(delivery, utc(2026, 3, 20, 12, 59)) == []
+    assert _fired(delivery, utc(2026, 3, 20, 13)) == [(utc(2026, 3, 20, 13), DAY, [2])]
+    assert delivery.get_status()['pending_contacts'] == 0
+
+def test_changed_timezone_replans():
+    contacts = FakeContacts({DAY: [(1, 'Asia/Kolkata')]})
+    delivery = _delivery(contacts)
+    assert _fired(delivery, utc(2026, 3, 20)) == []
+
+    contacts.change({DAY: [(1, 'America/New_York')]})
+    assert _fired(delivery, utc(2026, 3, 20, 3, 30)) == []
+    assert _fired(delivery, utc(2026, 3, 20, 13)) == [(utc(2026, 3, 20, 13), DAY, [1])]
+
+def test_changed_birthdate_replans():
+    contacts = FakeContacts({DAY: [(1, 'Asia/Kolkata')]})
+    delivery = _delivery(contacts)
+    assert _fired(delivery, utc(2026, 3, 20)) == []
+
+    next_day = date(2026, 3, 21)
+    contacts.change({next_day: [(1, 'Asia/Kolkata')]})
+    assert _fired(delivery, utc(2026, 3, 20, 3, 30)) == []
+    assert _fired(delivery, utc(2026, 3, 21, 3, 30)) == [(utc(2026, 3, 21, 3, 30), next_day, [1])]
+
+def test_plan_is_kept_while_contacts_are_unchanged():
+    contacts = FakeContacts({DAY: [(1, 'Asia/Kolkata')]})
+    delivery = _delivery(contacts)
+    assert _fired(delivery, utc(2026, 3, 20)) == []
+
+    contacts.rows_by_day = {}
+    assert _fired(delivery, utc(2026, 3, 20, 3, 30)) == [(utc(2026, 3, 20, 3, 30), DAY, [1])]
+
+def test_send_time_in_a_dst_gap_or_overlap_fires_once_at_standard_time():
+    new_york = pytz.timezone('America/New_York')
+    spring = date(2026, 3, 8)
+    autumn = date(2026, 11, 1)
+    # 02:30 does not exist on the spring-forward day; 01:30 happens twice on the fall-back day
+    assert local_send_time(spring, new_york, 2, 30) == utc(2026, 3, 8, 7, 30)
+    assert local_send_time(autumn, new_york, 1, 30) == utc(2026, 11, 1, 6, 30)
+
+    contacts = FakeContacts({spring: [(1, 'America/New_York')]})
+    delivery = _delivery(contacts)
+    fired = [_fired(delivery, utc(2026, 3, 8, hour, minute), 2, 30) for hour in range(0, 12) for minute in (0, 30)]
+    assert [slot for slots in fired for slot in slots] == [(utc(2026, 3, 8, 7, 30), spring, [1])]
+
+class RecordingService:
+    def __init__(self):
+        self.sent_to = []
+
+    def deliver_birthday_message(self, name, number, wisher_name, message_body=None):
+        self.sent_to.append(name)
+        return True, 'SM1', None
+
+def _add_contact(name, timezone, number):
+    contact = Contact(name=name, birthdate=date(1990, 3, 20), birthday_key=get_birthday_key(date(1990, 3, 20)),
+                      whatsapp_number=number, whatsapp_e164=number, timezone=timezone)
+    db.session.add(contact)
+    bump_data_version('contacts')
+    db.session.commit()
+    return contact
+
+def test_new_leader_catch_up_skips_sends_the_ledger_recorded(app):
+    asha = _add_contact('Asha', 'Asia/Kolkata', '+919876543210')
+    ravi = _add_contact('Ravi', None, '+919876543211')
+    now = utc(2026, 3, 20, 3, 31)
+
+    def new_leader():
+        return LocalTimeDelivery(_load_local_delivery_rows, lambda: get_data_version('contacts'), DEFAULT_TIMEZONE,
+                                 catch_up_seconds=300)
+
+    [(_, day, contact_ids)] = new_leader().tick(9, 0, now)
+    assert (day, sorted(contact_ids)) == (DAY, [asha.id, ravi.id])
+
+    # The old leader sent Asha before handing over the lease
+    claimed = claim_deliveries([asha.id], DAY)
+    record_deliveries(claimed, [(asha.id, True, 'SM0', None)])
+
+    [(_, day, contact_ids)] = new_leader().tick(9, 0, now)
+    service = RecordingService()
+    results, skipped = send_birthday_batch(service, Contact.query.filter(Contact.id.in_(contact_ids)).all(), 'Me', day)
+    assert skipped == 1
+    assert service.sent_to == ['Ravi']
+    assert [result['success'] for result in results] == [True]
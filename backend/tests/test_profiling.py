@@ -0,0 +1,23 @@
+import pytest
+
+import profiling
+
+@pytest.fixture
+def admin_token(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ADMIN_TOKEN', 's3cret')
+    return 's3cret'
+
+@pytest.mark.parametrize('token', [None, '', 's3cre', 's3creté', 'éééééé'])
+def test_admin_token_rejects_other_tokens(admin_token, token):
+    assert not profiling.check_admin_token(token)
+
+def test_admin_token_accepts_the_configured_token(admin_token):
+    assert profiling.check_admin_token(admin_token)
+
+def test_admin_token_is_off_when_unset(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ADMIN_TOKEN', '')
+    assert not profiling.check_admin_token('')
+
+def test_non_ascii_admin_header_is_not_found(client, admin_token):
+    response = client.get('/api/admin/profiling', headers={'X-Admin-Token': 'café'})
+    assert response.status_code == 404
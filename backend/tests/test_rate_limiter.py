@@ -0,0 +1,89 @@
+import pytest
+
+from rate_limiter import AdaptiveTokenBucket, parse_retry_after
+
+class FakeClock:
+    """Monotonic clock that only moves when slept on or advanced"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+def _bucket(clock, **kwargs):
+    return AdaptiveTokenBucket(clock=clock, sleep=clock.sleep, **kwargs)
+
+def test_burst_then_paced_at_the_rate():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=10, burst=3)
+
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.1)
+    assert bucket.acquire() == pytest.approx(0.1)
+
+def test_idle_time_refills_up_to_the_burst():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=10, burst=3)
+    for _ in range(3):
+        bucket.acquire()
+
+    clock.advance(10)
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0]
+    assert bucket.acquire() == pytest.approx(0.1)
+
+def test_throttle_halves_the_rate_once_per_window():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=10, burst=1)
+
+    bucket.on_throttled()
+    bucket.on_throttled()
+    assert bucket.rate == 5
+    clock.advance(1.0)
+    bucket.on_throttled()
+    assert bucket.rate == 2.5
+    # Throttling empties the bucket, so the next send waits a token at the new rate
+    assert bucket.acquire() == pytest.approx(0.4)
+
+def test_throttle_never_goes_below_the_min_rate():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=1, min_rate=0.2)
+    for _ in range(10):
+        bucket.on_throttled()
+        clock.advance(1.0)
+    assert bucket.rate == 0.2
+
+def test_retry_after_pauses_the_bucket():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=10, burst=10)
+
+    bucket.on_throttled(retry_after=3)
+    assert bucket.get_stats()['blocked_for_seconds'] == 3
+    assert bucket.acquire() == pytest.approx(3)
+    assert bucket.get_stats()['throttled'] == 1
+
+def test_rate_recovers_only_after_the_recovery_delay():
+    clock = FakeClock()
+    bucket = _bucket(clock, rate=10, recovery_delay=5)
+    bucket.on_throttled()
+
+    clock.advance(4.9)
+    bucket.on_success()
+    assert bucket.rate == 5
+
+    clock.advance(0.1)
+    for _ in range(30):
+        bucket.on_success()
+    assert bucket.rate == 10
+
+@pytest.mark.parametrize('value, seconds', [('2', 2.0), ('-1', 0.0), (None, None), ('Wed, 21 Oct 2026 07:28:00 GMT', None)])
+def test_parse_retry_after(value, seconds):
+    assert parse_retry_after(value) == seconds
@@ -0,0 +1,31 @@
+from datetime import date, datetime, timedelta
+
+from app import db, MessageDelivery
+from delivery_ledger import claim_deliveries, record_deliveries
+from retry_queue import claim_due_retries
+
+DAY = date(2026, 10, 16)
+
+def _queue_retry(contact_id, day):
+    claimed = claim_deliveries([contact_id], day)
+    record_deliveries(claimed, [(contact_id, False, 'Twilio 503', 'server_error')])
+    MessageDelivery.query.filter_by(id=claimed[contact_id].id).update({
+        MessageDelivery.next_attempt_at: datetime.utcnow() - timedelta(seconds=1)
+    })
+    db.session.commit()
+    return claimed[contact_id].id
+
+def test_one_row_per_contact_is_claimed_per_pass(app):
+    first = _queue_retry(1, DAY - timedelta(days=1))
+    second = _queue_retry(1, DAY)
+
+    claimed = claim_due_retries()
+    assert list(claimed) == [1]
+    claimed_id = claimed[1].id
+    left_id = second if claimed_id == first else first
+    assert db.session.get(MessageDelivery, claimed_id).status == 'pending'
+    assert db.session.get(MessageDelivery, left_id).status == 'retry'
+
+    record_deliveries(claimed, [(1, True, 'SM1', None)])
+    assert claim_due_retries()[1].id == left_id
+    assert db.session.get(MessageDelivery, claimed_id).status == 'sent'
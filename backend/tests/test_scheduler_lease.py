@@ -0,0 +1,31 @@
+import threading
+
+from scheduler_lease import LeaderLease, take_watched_lease, watch_lease
+
+def test_watcher_starts_the_scheduler_only_once_it_wins_the_lease(app):
+    holder = LeaderLease('test_lease', ttl=0.3)
+    assert holder.acquire()
+    acquired = threading.Event()
+
+    watcher = watch_lease('test_lease', acquired.set, ttl=0.3)
+    assert watch_lease('test_lease', acquired.set) is watcher
+    assert holder.acquire()
+    assert not acquired.is_set()
+
+    # The holder stops renewing, so the watcher takes over once the lease expires
+    assert acquired.wait(2)
+    lease = take_watched_lease('test_lease')
+    assert lease is watcher.lease
+    assert lease.acquire()
+    assert not holder.acquire()
+    assert take_watched_lease('test_lease') is None
+
+def test_taken_lease_stops_the_watcher(app):
+    holder = LeaderLease('test_lease')
+    assert holder.acquire()
+    called = threading.Event()
+
+    watch_lease('test_lease', called.set, ttl=0.3)
+    take_watched_lease('test_lease')
+    holder.release()
+    assert not called.wait(0.5)
@@ -0,0 +1,37 @@
+from datetime import datetime, timedelta
+
+import pytest
+from apscheduler.triggers.date import DateTrigger
+
+from scheduler_service import BirthdayScheduler, LOCAL_DELIVERY_JOB_ID, run_interval_end
+
+@pytest.fixture
+def scheduler(app):
+    birthday_scheduler = BirthdayScheduler()
+    yield birthday_scheduler
+    birthday_scheduler.shutdown()
+
+def _job_ids(scheduler):
+    return {job.id for job in scheduler.scheduler.get_jobs()} - {'retry_queue_drain'}
+
+def test_local_delivery_replaces_daily_and_interval_checks(scheduler):
+    assert scheduler.start_daily_check(21, 50)[0]
+    assert scheduler.start_interval_check(5)[0]
+    scheduler.scheduler.add_job(
+        func=run_interval_end,
+        trigger=DateTrigger(run_date=datetime.now(scheduler.scheduler.timezone) + timedelta(hours=1)),
+        id=scheduler.interval_end_job_id
+    )
+
+    assert scheduler.start_local_delivery(9, 0)[0]
+    assert _job_ids(scheduler) == {LOCAL_DELIVERY_JOB_ID}
+
+@pytest.mark.parametrize('start_check, job_id', [
+    (lambda scheduler: scheduler.start_daily_check(21, 50), 'daily_birthday_check'),
+    (lambda scheduler: scheduler.start_interval_check(5), 'interval_birthday_check'),
+])
+def test_daily_and_interval_checks_replace_local_delivery(scheduler, start_check, job_id):
+    assert scheduler.start_local_delivery(9, 0)[0]
+
+    assert start_check(scheduler)[0]
+    assert _job_ids(scheduler) == {job_id}
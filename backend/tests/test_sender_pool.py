@@ -0,0 +1,87 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import db, SenderNumber
+from sender_pool import SENDER_FAILURE_THRESHOLD, SenderPool, SenderSlot, load_sender_pool
+from whatsapp_service import create_whatsapp_service
+
+DAY = date(2026, 10, 16)
+
+class FakeContact:
+    def __init__(self, contact_id):
+        self.id = contact_id
+
+@pytest.fixture
+def default_service():
+    return create_whatsapp_service({
+        'twilio_account_sid': 'AC' + '0' * 32,
+        'twilio_auth_token': 'token',
+        'twilio_whatsapp_number': '+14155550100'
+    })
+
+def _add_senders(*numbers):
+    senders = [SenderNumber(whatsapp_number=number) for number in numbers]
+    db.session.add_all(senders)
+    db.session.commit()
+    return senders
+
+def _pool(*numbers):
+    return SenderPool(SenderSlot(index, number, None, 1.0) for index, number in enumerate(numbers, 1))
+
+def _result(success, error_class=None):
+    return {'success': success, 'message': 'SM1' if success else f'{error_class} failure', 'error_class': error_class}
+
+def test_rendezvous_assignment_is_stable_and_moves_only_a_removed_senders_contacts():
+    contacts = [FakeContact(contact_id) for contact_id in range(1, 301)]
+    numbers = ('+14155550101', '+14155550102', '+14155550103')
+    before = [slot.number for slot in _pool(*numbers).assign(contacts)]
+
+    assert [slot.number for slot in _pool(*numbers).assign(contacts)] == before
+    assert len(set(before)) == 3
+
+    after = [slot.number for slot in _pool(*numbers[:2]).assign(contacts)]
+    for old, new in zip(before, after):
+        if old != numbers[2]:
+            assert new == old
+
+def test_daily_limit_sends_overflow_to_the_next_sender():
+    pool = SenderPool([SenderSlot(1, '+14155550101', None, 1.0, remaining=0), SenderSlot(2, '+14155550102', None, 1.0)])
+    assert {slot.sender_id for slot in pool.assign([FakeContact(i) for i in range(1, 21)])} == {2}
+
+def test_sender_errors_bench_a_sender_and_a_success_clears_it(app, default_service):
+    _add_senders('+14155550101', '+14155550102')
+    pool = load_sender_pool(default_service, DAY)
+    bad, good = pool.slots
+
+    pool.record_results([bad] * SENDER_FAILURE_THRESHOLD, [_result(False, 'sender_error')] * SENDER_FAILURE_THRESHOLD,
+                        DAY, 1.0)
+    sender = db.session.get(SenderNumber, bad.sender_id)
+    assert sender.consecutive_failures == SENDER_FAILURE_THRESHOLD
+    assert not sender.is_healthy()
+    assert [slot.sender_id for slot in load_sender_pool(default_service, DAY).slots] == [good.sender_id]
+
+    # Once the cool-down is over, one success resets the streak
+    sender.unhealthy_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    pool = load_sender_pool(default_service, DAY)
+    pool.record_results([pool.slots[0]], [_result(True)], DAY, 1.0)
+    db.session.refresh(sender)
+    assert (sender.consecutive_failures, sender.unhealthy_until, sender.sent_today) == (0, None, 1)
+
+@pytest.mark.parametrize('error_class', ['client_error', 'invalid_number', 'throttled', 'unexpected'])
+def test_recipient_errors_do_not_bench_a_sender(app, default_service, error_class):
+    _add_senders('+14155550101')
+    pool = load_sender_pool(default_service, DAY)
+    count = SENDER_FAILURE_THRESHOLD * 2
+    pool.record_results(pool.slots * count, [_result(False, error_class)] * count, DAY, 1.0)
+
+    sender = SenderNumber.query.one()
+    assert sender.consecutive_failures == 0
+    assert sender.is_healthy()
+
+def test_pool_falls_back_to_the_settings_number_when_every_sender_is_benched(app, default_service):
+    for sender in _add_senders('+14155550101', '+14155550102'):
+        sender.unhealthy_until = datetime.utcnow() + timedelta(minutes=5)
+    db.session.commit()
+    assert load_sender_pool(default_service, DAY) is None
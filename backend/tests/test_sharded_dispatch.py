@@ -0,0 +1,36 @@
+from datetime import date, datetime, timedelta
+
+from app import db, MessageDelivery
+from delivery_ledger import claim_deliveries, record_deliveries
+from sharded_dispatch import _crashed_shard_report, split_into_shards
+
+DAY = date(2026, 10, 16)
+
+def test_shards_split_every_contact_once_in_order():
+    shards = split_into_shards(list(range(1, 101)), 4)
+    assert sorted(contact_id for shard in shards for contact_id in shard) == list(range(1, 101))
+    assert all(shard == sorted(shard) for shard in shards)
+    assert split_into_shards(list(range(1, 101)), 4) == shards
+
+def test_crashed_shard_counts_only_its_unfinished_sends_as_failed(app):
+    # Contact 5 was sent by an earlier run
+    earlier = claim_deliveries([5], DAY)
+    record_deliveries(earlier, [(5, True, 'SM0', None)])
+    MessageDelivery.query.filter_by(contact_id=5).update({MessageDelivery.updated_at: datetime.utcnow() - timedelta(hours=1)})
+    db.session.commit()
+    started = datetime.utcnow()
+
+    # The shard sent 1, queued 2 for retry, claimed 3 and died before 4
+    claimed = claim_deliveries([1, 2, 3], DAY)
+    record_deliveries(claimed, [(1, True, 'SM1', None), (2, False, 'Twilio 503', 'server_error')])
+
+    report = _crashed_shard_report(0, [1, 2, 3, 4, 5], DAY, started, 'Dispatch shard 0 failed: boom')
+    assert (report['contacts'], report['sent'], report['failed'], report['skipped']) == (5, 1, 3, 1)
+    assert report['outcomes'] == [
+        (1, True, 'SM1', None),
+        (2, False, 'Twilio 503', 'server_error'),
+        (3, False, 'Dispatch shard 0 failed: boom', 'dispatch_error'),
+        (4, False, 'Dispatch shard 0 failed: boom', 'dispatch_error')
+    ]
+    statuses = dict(db.session.query(MessageDelivery.contact_id, MessageDelivery.status))
+    assert statuses == {1: 'sent', 2: 'retry', 3: 'retry', 4: 'retry', 5: 'sent'}
@@ -0,0 +1,46 @@
+"""
+Calendar helpers for upcoming birthday lookups
+
+Contacts are handled as two compact arrays (ids and MMDD birthday keys) and
+days-until is resolved through a lookup table built once per day; the
+calendar index buckets contacts with these.
+"""
+
+from array import array
+from datetime import date, timedelta
+
+from utils import get_birthday_key, get_birthday_keys_for_date
+
+# Largest MMDD birthday key (Dec 31)
+MAX_BIRTHDAY_KEY = 1231
+
+# Every valid birthday key in calendar order (a leap year covers Feb 29)
+ALL_BIRTHDAY_KEYS = [
+    get_birthday_key(date(2000, 1, 1) + timedelta(days=offset)) for offset in range(366)
+]
+# Calendar slot (0-365) of every birthday key
+BIRTHDAY_KEY_SLOTS = {key: position for position, key in enumerate(ALL_BIRTHDAY_KEYS)}
+
+def build_days_until_table(today):
+    """Map every birthday key to the days until it is next celebrated
+
+    Returns an array indexed by birthday key; unused keys hold -1. Feb 29
+    birthdays fall on Feb 28 in non-leap years, matching Contact.birthdays_on().
+    """
+    table = array('h', [-1]) * (MAX_BIRTHDAY_KEY + 1)
+    for offset in range(366):
+        for key in get_birthday_keys_for_date(today + timedelta(days=offset)):
+            if table[key] == -1:
+                table[key] = offset
+    return table
+
+def load_birthday_columns(rows):
+    """Load (id, birthday_key) rows into compact id and key arrays"""
+    ids = array('q')
+    keys = array('H')
+    for contact_id, key in rows:
+        if key is None:
+            continue
+        ids.append(contact_id)
+        keys.append(key)
+    return ids, keys
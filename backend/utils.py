@@ -2,47 +2,24 @@
 Utility functions for the birthday reminder app
 """
 
+import os
 import re
+import calendar
 from datetime import datetime, date
 import logging
+import pytz
+from logging_config import SAMPLED
+# Re-exported for existing callers; phone_numbers holds the single normalization rule
+from phone_numbers import validate_phone_number, normalize_e164 as format_whatsapp_number
 
 logger = logging.getLogger(__name__)
 
-def validate_phone_number(phone_number):
-    """Validate and format phone number"""
-    if not phone_number:
-        return False, "Phone number is required"
-    
-    # Remove whatsapp: prefix if present
-    clean_number = phone_number.replace("whatsapp:", "").strip()
-    
-    # Check if it's a valid phone number format
-    # Allow +, digits, spaces, dashes, and parentheses
-    pattern = r'^[\+]?[1-9][\d\s\-$$$$]{7,15}$'
-    
-    if not re.match(pattern, clean_number):
-        return False, "Invalid phone number format"
-    
-    return True, clean_number
+# Timezone that defines "today" for birthday checks and scheduled jobs
+SCHEDULER_TIMEZONE = os.environ.get('SCHEDULER_TIMEZONE', 'Asia/Kolkata')
 
-def format_whatsapp_number(phone_number):
-    """Format phone number for WhatsApp"""
-    # Remove any existing whatsapp: prefix
-    if phone_number.startswith("whatsapp:"):
-        phone_number = phone_number.replace("whatsapp:", "")
-    
-    # Remove any spaces, dashes, or parentheses, keep + and digits
-    cleaned = re.sub(r'[^\d\+]', '', phone_number)
-    
-    # Ensure it starts with +
-    if not cleaned.startswith('+'):
-        # Assume US number if no country code
-        if len(cleaned) == 10:
-            cleaned = '+1' + cleaned
-        else:
-            cleaned = '+' + cleaned
-    
-    return cleaned
+def get_local_today():
+    """Get today's date in the scheduler's timezone"""
+    return datetime.now(pytz.timezone(SCHEDULER_TIMEZONE)).date()
 
 def calculate_age(birthdate):
     """Calculate age from birthdate"""
@@ -85,10 +62,27 @@ def is_birthday_today(birthdate):
     today = date.today()
     return (today.month == birthdate.month and today.day == birthdate.day)
 
+def get_birthday_key(birthdate):
+    """Encode the month and day of a birthdate as a sortable integer (Dec 25 -> 1225)"""
+    return birthdate.month * 100 + birthdate.day
+
+def get_birthday_keys_for_date(day):
+    """Get the birthday keys celebrated on a given date
+
+    Feb 29 birthdays are celebrated on Feb 28 in non-leap years.
+    """
+    keys = [get_birthday_key(day)]
+    if day.month == 2 and day.day == 28 and not calendar.isleap(day.year):
+        keys.append(229)
+    return keys
+
 def log_whatsapp_activity(contact_name, phone_number, success, message, message_type="birthday"):
     """Log WhatsApp activity for debugging and monitoring"""
-    status = "SUCCESS" if success else "FAILED"
-    logger.info(f"WhatsApp {message_type.upper()} - {status}: {contact_name} ({phone_number}) - {message}")
+    if success:
+        logger.info("WhatsApp %s - SUCCESS: %s (%s) - %s", message_type.upper(), contact_name, phone_number, message,
+                    extra=SAMPLED)
+    else:
+        logger.warning("WhatsApp %s - FAILED: %s (%s) - %s", message_type.upper(), contact_name, phone_number, message)
 
 def sanitize_input(text, max_length=100):
     """Sanitize user input"""
@@ -1,22 +1,86 @@
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioException
+# twilio (and requests) are imported on first use, so importing the API stays cheap
+import hashlib
 import logging
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
 from datetime import datetime
+from rate_limiter import get_rate_limiter, parse_retry_after
+from metrics import SEND_OUTCOMES, TWILIO_SEND_SECONDS
+from profiling import phase, record_phase
+from dispatch import MAX_IN_FLIGHT
+from logging_config import SAMPLED
+from phone_numbers import normalize_e164, to_whatsapp_address
+from message_templates import MessageTemplates, render_birthday_message
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# How many times a send is retried after Twilio answers 429
+THROTTLE_RETRIES = 1
+
+# Send Messages API calls somewhere other than api.twilio.com, e.g. benchmarks/fake_twilio.py
+TWILIO_API_BASE_URL = os.environ.get('TWILIO_API_BASE_URL') or None
+
+# Twilio error codes meaning the recipient number can never be reached
+INVALID_NUMBER_CODES = {21211, 21214, 21217, 21608, 21614, 63003, 63024}
+
+# Twilio error codes blaming the sender: bad credentials, an inactive account or an unusable From number
+SENDER_ERROR_CODES = {20003, 20005, 21212, 21606, 63007, 63112}
+
+# Result of a send; error_class is None on success
+SendOutcome = namedtuple('SendOutcome', ['success', 'message', 'error_class'])
+
+def classify_send_error(error):
+    """Classify a send failure so callers can decide whether to retry it"""
+    from twilio.base.exceptions import TwilioException, TwilioRestException
+    from requests.exceptions import RequestException
+    
+    if isinstance(error, TwilioRestException):
+        if error.code in INVALID_NUMBER_CODES:
+            return 'invalid_number'
+        if error.code in SENDER_ERROR_CODES or error.status in (401, 403):
+            return 'sender_error'
+        if error.status == 429:
+            return 'throttled'
+        if error.status >= 500:
+            return 'server_error'
+        return 'client_error'
+    if isinstance(error, RequestException):
+        return 'network'
+    if isinstance(error, TwilioException):
+        return 'twilio_error'
+    return 'unexpected'
+
+# Retry-After header of the last response seen by each sending thread
+_last_response = threading.local()
+
+def _remember_retry_after(response, *args, **kwargs):
+    _last_response.retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
 class WhatsAppService:
-    def __init__(self, account_sid=None, auth_token=None, whatsapp_number=None):
+    def __init__(self, account_sid=None, auth_token=None, whatsapp_number=None, http_client=None,
+                 api_base_url=TWILIO_API_BASE_URL):
         self.account_sid = account_sid
         self.auth_token = auth_token
         self.whatsapp_number = whatsapp_number
+        # The sender address is the same for every message, so normalize it once
+        self.from_address = to_whatsapp_address(whatsapp_number) if whatsapp_number else ''
+        self.api_base_url = api_base_url
         self.client = None
         
         if account_sid and auth_token:
             try:
-                self.client = Client(account_sid, auth_token)
+                from twilio.rest import Client
+                if http_client is None:
+                    http_client = create_http_client()
+                response_hooks = http_client.request_hooks.setdefault('response', [])
+                if _remember_retry_after not in response_hooks:
+                    response_hooks.append(_remember_retry_after)
+                self.client = Client(account_sid, auth_token, http_client=http_client)
+                if api_base_url:
+                    self.client.api.base_url = api_base_url.rstrip('/')
+                    logger.info(f"Twilio API calls go to {self.client.api.base_url}")
                 logger.info("Twilio client initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Twilio client: {str(e)}")
@@ -26,86 +90,104 @@ class WhatsAppService:
         return all([self.account_sid, self.auth_token, self.whatsapp_number, self.client])
     
     def send_birthday_message(self, contact_name, contact_number, wisher_name):
-        """Send a personalized birthday message"""
+        """Send a personalized birthday message to a number in any format"""
+        outcome = self.deliver_birthday_message(contact_name, self.format_phone_number(contact_number), wisher_name)
+        return outcome.success, outcome.message
+    
+    def deliver_birthday_message(self, contact_name, contact_number, wisher_name, message_body=None):
+        """Send a personalized birthday message and classify any failure
+
+        contact_number must already be in E.164 form (Contact.send_number).
+        message_body is the pre-rendered text; without it the default
+        template is rendered.
+        """
+        outcome = self._deliver_birthday_message(contact_name, contact_number, wisher_name, message_body)
+        SEND_OUTCOMES.inc(outcome.error_class or 'sent')
+        return outcome
+    
+    def _deliver_birthday_message(self, contact_name, contact_number, wisher_name, message_body=None):
         if not self.is_configured():
             logger.error("WhatsApp service not properly configured")
-            return False, "WhatsApp service not configured"
+            return SendOutcome(False, "WhatsApp service not configured", 'not_configured')
         
+        from twilio.base.exceptions import TwilioException
         try:
-            # Format the birthday message
-            message_body = self.format_birthday_message(contact_name, wisher_name)
-            
-            # Ensure the contact number is in the correct format
-            formatted_number = self.format_phone_number(contact_number)
-            
-            # Ensure the Twilio from number is in WhatsApp channel format
-            from_number = self.whatsapp_number or ""
-            if not from_number.startswith("whatsapp:"):
-                # Normalize any raw phone number to E.164, then prefix with whatsapp:
-                normalized_from = self.format_phone_number(from_number) if from_number else from_number
-                from_number = f"whatsapp:{normalized_from}" if normalized_from else from_number
+            # Format the birthday message unless the caller rendered it already
+            if message_body is None:
+                with phase('render'):
+                    message_body = self.format_birthday_message(contact_name, wisher_name)
             
             # Send the message
-            message = self.client.messages.create(
-                body=message_body,
-                from_=from_number,
-                to=f"whatsapp:{formatted_number}"
-            )
+            message = self._create_message(message_body, contact_number)
             
-            logger.info(f"Birthday message sent successfully to {contact_name} ({formatted_number}). Message SID: {message.sid}")
-            return True, f"Message sent successfully (SID: {message.sid})"
+            # Lazy %-formatting: sampled-out lines are never formatted
+            logger.info("Birthday message sent successfully to %s (%s). Message SID: %s",
+                        contact_name, contact_number, message.sid, extra=SAMPLED)
+            return SendOutcome(True, f"Message sent successfully (SID: {message.sid})", None)
             
         except TwilioException as e:
             logger.error(f"Twilio error sending message to {contact_name}: {str(e)}")
-            return False, f"Twilio error: {str(e)}"
+            return SendOutcome(False, f"Twilio error: {str(e)}", classify_send_error(e))
         except Exception as e:
             logger.error(f"Unexpected error sending message to {contact_name}: {str(e)}")
-            return False, f"Unexpected error: {str(e)}"
+            return SendOutcome(False, f"Unexpected error: {str(e)}", classify_send_error(e))
+    
+    def _create_message(self, body, formatted_number):
+        """Send through Twilio, paced by the sender's shared rate limiter"""
+        from twilio.base.exceptions import TwilioRestException
+        from_number = self.from_address
+        limiter = get_rate_limiter(from_number)
+        
+        for attempt in range(THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            _last_response.retry_after = None
+            started = time.perf_counter()
+            try:
+                message = self.client.messages.create(
+                    body=body,
+                    from_=from_number,
+                    to=f"whatsapp:{formatted_number}"
+                )
+                elapsed = time.perf_counter() - started
+                TWILIO_SEND_SECONDS.observe(elapsed, 'ok')
+                record_phase('send', elapsed)
+                limiter.on_success()
+                return message
+            except TwilioRestException as e:
+                elapsed = time.perf_counter() - started
+                TWILIO_SEND_SECONDS.observe(elapsed, 'throttled' if e.status == 429 else 'error')
+                record_phase('send', elapsed)
+                if e.status != 429:
+                    raise
+                limiter.on_throttled(_last_response.retry_after)
+                logger.warning(f"Twilio throttled sender {from_number} (attempt {attempt + 1})")
+                if attempt == THROTTLE_RETRIES:
+                    raise
+            except Exception:
+                elapsed = time.perf_counter() - started
+                TWILIO_SEND_SECONDS.observe(elapsed, 'error')
+                record_phase('send', elapsed)
+                raise
     
     def format_birthday_message(self, contact_name, wisher_name):
-        """Format a birthday message using the business-specified template"""
-        return (
-            "Hi there! This is Ribbon & Balloons with Asha Traders, and today’s a super special day – it’s your Birthday! "
-            "Wishing you loads of happiness, laughter, and sweet surprises. Happiest Birthday from all of us to you!"
-        )
+        """Format a birthday message from the default template set"""
+        return render_birthday_message(contact_name, wisher_name)
     
     def format_phone_number(self, phone_number):
         """Format phone number to ensure it works with WhatsApp"""
-        # Remove any existing whatsapp: prefix
-        if phone_number.startswith("whatsapp:"):
-            phone_number = phone_number.replace("whatsapp:", "")
-        
-        # Remove any spaces, dashes, or parentheses
-        cleaned_number = ''.join(filter(str.isdigit, phone_number.replace('+', '')))
-        
-        # Add + prefix if not present
-        if not phone_number.startswith('+'):
-            cleaned_number = '+' + cleaned_number
-        else:
-            cleaned_number = '+' + cleaned_number
-            
-        return cleaned_number
+        return normalize_e164(phone_number)
     
     def send_test_message(self, test_number, wisher_name):
         """Send a test message to verify WhatsApp integration"""
         if not self.is_configured():
             return False, "WhatsApp service not configured"
         
+        from twilio.base.exceptions import TwilioException
         try:
-            message_body = f"🧪 Test message from Birthday Reminder App!\n\nThis is a test to verify your WhatsApp integration is working correctly.\n\n– from {wisher_name}"
+            message_body = MessageTemplates.get_test_message(wisher_name)
             formatted_number = self.format_phone_number(test_number)
             
-            # Ensure the Twilio from number is in WhatsApp channel format
-            from_number = self.whatsapp_number or ""
-            if not from_number.startswith("whatsapp:"):
-                normalized_from = self.format_phone_number(from_number) if from_number else from_number
-                from_number = f"whatsapp:{normalized_from}" if normalized_from else from_number
-            
-            message = self.client.messages.create(
-                body=message_body,
-                from_=from_number,
-                to=f"whatsapp:{formatted_number}"
-            )
+            message = self._create_message(message_body, formatted_number)
             
             logger.info(f"Test message sent successfully to {formatted_number}. Message SID: {message.sid}")
             return True, f"Test message sent successfully (SID: {message.sid})"
@@ -117,10 +199,60 @@ class WhatsAppService:
             logger.error(f"Unexpected error sending test message: {str(e)}")
             return False, f"Unexpected error: {str(e)}"
 
+# Cached services keyed on a fingerprint of their credentials
+MAX_CACHED_SERVICES = 32
+_services = OrderedDict()
+_services_lock = threading.Lock()
+
+def configure_connection_pool(http_client, pool_size=MAX_IN_FLIGHT):
+    """Size a Twilio HTTP client's keep-alive pool for concurrent sending"""
+    from requests.adapters import HTTPAdapter
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    http_client.session.mount('https://', adapter)
+    http_client.session.mount('http://', adapter)
+    return http_client
+
+def create_http_client():
+    """Create a Twilio HTTP client with a pooled keep-alive session"""
+    from twilio.http.http_client import TwilioHttpClient
+    return configure_connection_pool(TwilioHttpClient())
+
+def get_credentials_fingerprint(settings):
+    """Fingerprint the Twilio credentials in a settings dict"""
+    parts = [
+        settings.get('twilio_account_sid') or '',
+        settings.get('twilio_auth_token') or '',
+        settings.get('twilio_whatsapp_number') or ''
+    ]
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
 def create_whatsapp_service(settings):
-    """Factory function to create WhatsApp service from settings"""
-    return WhatsAppService(
-        account_sid=settings.get('twilio_account_sid'),
-        auth_token=settings.get('twilio_auth_token'),
-        whatsapp_number=settings.get('twilio_whatsapp_number')
-    )
+    """Factory function to get a WhatsApp service for the given settings
+
+    Services are cached per credentials, so the Twilio client and its pooled
+    HTTP connections are reused across API requests and scheduler runs.
+    """
+    fingerprint = get_credentials_fingerprint(settings)
+    with _services_lock:
+        service = _services.get(fingerprint)
+        if service is not None:
+            _services.move_to_end(fingerprint)
+            return service
+        
+        service = WhatsAppService(
+            account_sid=settings.get('twilio_account_sid'),
+            auth_token=settings.get('twilio_auth_token'),
+            whatsapp_number=settings.get('twilio_whatsapp_number')
+        )
+        _services[fingerprint] = service
+        if len(_services) > MAX_CACHED_SERVICES:
+            _services.popitem(last=False)
+        return service
+
+def invalidate_whatsapp_services(settings=None):
+    """Drop the cached service for the given settings, or every cached service"""
+    with _services_lock:
+        if settings is None:
+            _services.clear()
+        else:
+            _services.pop(get_credentials_fingerprint(settings), None)